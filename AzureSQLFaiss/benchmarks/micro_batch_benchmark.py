@@ -0,0 +1,123 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Benchmark one-query-at-a-time search against the micro-batching search service.
+
+Concurrent clients issue queries against a random corpus index, first each
+calling encode and index.search for its own query (what search_faiss_index in
+Faiss_inference.ipynb does), then through faiss_search_service.MicroBatchSearcher.
+Throughput and latency percentiles are printed for each run:
+
+    python benchmarks/micro_batch_benchmark.py --clients 32 --max-batch-size 32 --max-wait-ms 5
+
+--synthetic replaces the SentenceTransformer model with a stack of dense layers of
+the same width, for machines without the model files.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from faiss_search_service import MicroBatchSearcher  # noqa: E402
+
+QUERIES = ["A high-stakes heist in a bustling city", "A lonely robot falls in love", "Friends on a road trip",
+           "A detective hunts a serial killer", "Aliens invade a small town", "A family reunites for the holidays"]
+
+
+class SyntheticEncoder:
+    """Stand-in for a transformer: a few dense layers, so batching pays off the same way."""
+
+    def __init__(self, dimension: int = 384, layers: int = 6, tokens: int = 4):
+        rng = np.random.default_rng(0)
+        self.tokens = tokens
+        self.weights = [rng.standard_normal((dimension, dimension)).astype(np.float32) / np.sqrt(dimension)
+                        for _ in range(layers)]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.weights[0].shape[0]
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=False):
+        rng = np.random.default_rng(len(texts))
+        hidden = rng.standard_normal((len(texts) * self.tokens, self.weights[0].shape[0])).astype(np.float32)
+        for weight in self.weights:
+            hidden = np.tanh(hidden @ weight)
+        vectors = hidden.reshape(len(texts), self.tokens, -1).mean(axis=1)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+def direct_search(model, index, text: str, top_n: int):
+    vector = model.encode([text], convert_to_numpy=True, normalize_embeddings=True)
+    return index.search(np.asarray(vector, dtype=np.float32), top_n)
+
+
+def run(name: str, search, clients: int, queries_per_client: int):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset: int):
+        timings = []
+        for i in range(queries_per_client):
+            start = time.perf_counter()
+            search(QUERIES[(offset + i) % len(QUERIES)])
+            timings.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    print(f"{name:<14} queries={len(latencies):<6} throughput={len(latencies) / elapsed:8.1f} q/s "
+          f"p50={p50 * 1000:7.2f} ms p99={p99 * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--queries-per-client", type=int, default=20)
+    parser.add_argument("--corpus", type=int, default=100_000)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--synthetic", action="store_true")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        model = SyntheticEncoder()
+    else:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model)
+    dimension = model.get_sentence_embedding_dimension()
+    corpus = np.random.default_rng(1).standard_normal((args.corpus, dimension)).astype(np.float32)
+    faiss.normalize_L2(corpus)
+    index = faiss.IndexFlatIP(dimension)
+    index.add(corpus)
+
+    run("per query", lambda text: direct_search(model, index, text, args.top_n),
+        args.clients, args.queries_per_client)
+    searcher = MicroBatchSearcher(model, index, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    try:
+        run("micro-batched", lambda text: searcher.search(text, args.top_n), args.clients, args.queries_per_client)
+    finally:
+        searcher.close()
+    print(searcher.stats())
+
+
+if __name__ == "__main__":
+    main()
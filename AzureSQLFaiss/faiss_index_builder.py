@@ -0,0 +1,166 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Streaming, chunked FAISS index builder for text stored in Azure SQL.
+
+Instead of reading the whole table into a DataFrame and encoding every row in
+one call, rows are pulled with fetchmany, encoded in fixed-size batches and
+appended to the index chunk by chunk, so memory besides the index itself stays
+bounded by the chunk size. For large corpora an IVF or IVF-PQ index can be
+trained on a random sample first.
+
+Every build writes a new version into the output directory (index file and ID
+map, a faiss_metadata_store with the key and text of each vector in index order)
+and then atomically replaces manifest.json to point at it, so readers never
+see a half-written index or an index paired with the wrong ID map.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Optional
+
+import faiss
+import numpy as np
+
+from faiss_metadata_store import MetadataWriter
+
+MANIFEST_FILE = "manifest.json"
+FETCH_SIZE = 10_000
+ENCODE_BATCH_SIZE = 256
+# Older versions stay on disk for readers that still have them open.
+KEEP_VERSIONS = 2
+
+
+def _write_json_atomic(path: str, data: dict):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_manifest(output_dir: str) -> Optional[dict]:
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def iter_chunks(cursor, fetch_size: int = FETCH_SIZE):
+    """Yield the rows of an executed cursor fetch_size at a time."""
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def encode(model, texts: list, batch_size: int = ENCODE_BATCH_SIZE) -> np.ndarray:
+    """Normalized float32 embeddings, so inner product equals cosine similarity."""
+    vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def create_index(index_type: str, dimension: int, nlist: int = 1024, pq_m: int = 16, pq_nbits: int = 8):
+    """'flat' is exact; 'ivf' and 'ivfpq' trade some recall for speed and memory and need training."""
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dimension)
+    quantizer = faiss.IndexFlatIP(dimension)
+    if index_type == "ivf":
+        return faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "ivfpq":
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits, faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"unknown index type {index_type!r}, expected 'flat', 'ivf' or 'ivfpq'")
+
+
+def sample_query(query: str, text_column: str, sample_size: int) -> str:
+    """
+    A random sample of the texts, drawn server-side so only the sample crosses the network.
+
+    query becomes a derived table, so it must not end in an ORDER BY (without TOP or
+    OFFSET); SQL Server rejects that. The order of the sample is random anyway.
+    """
+    return f"SELECT TOP ({int(sample_size)}) [{text_column}] FROM ({query}) AS src ORDER BY NEWID()"
+
+
+def _prune_versions(output_dir: str, keep: int):
+    versions = sorted(name for name in os.listdir(output_dir)
+                      if name.startswith("v") and os.path.isdir(os.path.join(output_dir, name)))
+    current = (read_manifest(output_dir) or {}).get("version")
+    for name in versions[:-keep] if keep else versions:
+        if name != current:
+            shutil.rmtree(os.path.join(output_dir, name))
+
+
+def build_index(conn, model, output_dir: str, query: str = "SELECT Title, Plot FROM dbo.movie_plots",
+                text_column: str = "Plot", key_column: str = "Title", index_type: str = "flat",
+                nlist: int = 1024, pq_m: int = 16, pq_nbits: int = 8, nprobe: int = 16,
+                train_size: Optional[int] = None, fetch_size: int = FETCH_SIZE,
+                encode_batch_size: int = ENCODE_BATCH_SIZE, log: Callable[[str], None] = print) -> dict:
+    """
+    Build a new index version from the rows of query and publish it through manifest.json.
+
+    Vector i of the index belongs to row i of the metadata store, which holds the key_column
+    and text_column values of that row. Returns the manifest plus throughput statistics.
+    With train_size, query must not end in an ORDER BY (see sample_query).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    now = time.time()
+    version = time.strftime("v%Y%m%dT%H%M%S", time.gmtime(now)) + f"{int(now * 1000) % 1000:03d}"
+    version_dir = os.path.join(output_dir, version)
+    os.makedirs(version_dir)
+    dimension = model.get_sentence_embedding_dimension()
+    index = create_index(index_type, dimension, nlist=nlist, pq_m=pq_m, pq_nbits=pq_nbits)
+
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        if not index.is_trained:
+            # FAISS wants at least 39 training points per list and per PQ centroid.
+            train_size = train_size or max(64 * nlist, 39 * 2 ** pq_nbits)
+            cursor.execute(sample_query(query, text_column, train_size))
+            sample = [row[0] for rows in iter_chunks(cursor, fetch_size) for row in rows]
+            log(f"Training {index_type} index on {len(sample)} sampled rows")
+            index.train(encode(model, sample, encode_batch_size))
+            del sample
+            index.nprobe = nprobe
+
+        cursor.execute(query)
+        columns = [col[0] for col in cursor.description]
+        text_at, key_at = columns.index(text_column), columns.index(key_column)
+        rows_done = 0
+        with MetadataWriter(os.path.join(version_dir, "metadata"), [key_column, text_column]) as metadata:
+            for rows in iter_chunks(cursor, fetch_size):
+                texts = [row[text_at] or "" for row in rows]
+                index.add(encode(model, texts, encode_batch_size))
+                metadata.append((row[key_at], text) for row, text in zip(rows, texts))
+                rows_done += len(rows)
+                log(f"{rows_done} rows indexed, {rows_done / (time.perf_counter() - start):.0f} rows/s")
+    finally:
+        cursor.close()
+
+    faiss.write_index(index, os.path.join(version_dir, "index.faiss"))
+    elapsed = time.perf_counter() - start
+    manifest = {
+        "version": version,
+        "index": os.path.join(version, "index.faiss"),
+        "metadata": os.path.join(version, "metadata"),
+        "index_type": index_type,
+        "nprobe": nprobe if index_type != "flat" else None,
+        "dimension": dimension,
+        "count": rows_done,
+        "created_at": time.time(),
+    }
+    _write_json_atomic(os.path.join(output_dir, MANIFEST_FILE), manifest)
+    _prune_versions(output_dir, KEEP_VERSIONS)
+
+    log(f"Indexed {rows_done} rows in {elapsed:.1f}s ({rows_done / max(elapsed, 1e-9):.0f} rows/s), version {version}")
+    return dict(manifest, seconds=elapsed, rows_per_second=rows_done / max(elapsed, 1e-9))
@@ -0,0 +1,125 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Hot reload of the FAISS index published by faiss_index_builder.
+
+IndexHolder keeps the active version (index plus metadata store) and polls the
+manifest of the index directory. When the builder publishes a new version it is
+loaded in the background, memory-mapped where the index type allows it, and then
+swapped in with a single reference assignment. A search that already took the
+old version keeps using it until it finishes; the old version is released when
+the last such search drops its reference.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import faiss
+
+from faiss_index_builder import read_manifest
+from faiss_metadata_store import MetadataStore
+
+POLL_SECONDS = 5.0
+
+
+def read_index(path: str, use_mmap: bool = True):
+    """Map the index file instead of reading it when faiss supports that for its type."""
+    if use_mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path)
+
+
+class IndexVersion:
+    """One published version: the index, its metadata store and the manifest describing them."""
+
+    def __init__(self, index_dir: str, manifest: dict, use_mmap: bool = True):
+        self.manifest = manifest
+        self.version = manifest["version"]
+        self.index = read_index(os.path.join(index_dir, manifest["index"]), use_mmap)
+        if manifest.get("nprobe"):
+            self.index.nprobe = manifest["nprobe"]
+        self.metadata = MetadataStore(os.path.join(index_dir, manifest["metadata"]))
+
+
+class IndexHolder:
+    """
+    Double-buffered holder of the current IndexVersion of index_dir.
+
+    Callers take current() once per search and use that version for both the
+    search and the hydration of its hits, so both always match.
+    """
+
+    def __init__(self, index_dir: str, poll_seconds: float = POLL_SECONDS, use_mmap: bool = True,
+                 log: Callable[[str], None] = print):
+        self.index_dir = index_dir
+        self.poll_seconds = poll_seconds
+        self.use_mmap = use_mmap
+        self.log = log
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._current = None
+        self._reloads = 0
+        self._reload_failures = 0
+        self._last_reload_seconds = None
+        self._loaded_at = None
+        if not self.reload():
+            raise FileNotFoundError(f"no index manifest in {index_dir}")
+        self._watcher = None
+        if poll_seconds:
+            self._watcher = threading.Thread(target=self._watch, name="faiss-index-reload", daemon=True)
+            self._watcher.start()
+
+    def current(self) -> IndexVersion:
+        return self._current
+
+    def reload(self) -> bool:
+        """Load and activate the version in the manifest if it is new; returns whether it swapped."""
+        with self._reload_lock:
+            manifest = read_manifest(self.index_dir)
+            if manifest is None or (self._current is not None and manifest["version"] == self._current.version):
+                return False
+            start = time.perf_counter()
+            try:
+                version = IndexVersion(self.index_dir, manifest, self.use_mmap)
+            except Exception:
+                self._reload_failures += 1
+                if self._current is None:
+                    raise
+                # Keep serving the old version; the next poll tries again.
+                self.log(f"Loading index version {manifest['version']} failed, still serving {self._current.version}")
+                return False
+            self._current = version
+            self._reloads += 1
+            self._last_reload_seconds = time.perf_counter() - start
+            self._loaded_at = time.time()
+            self.log(f"Serving index version {version.version}, loaded in {self._last_reload_seconds:.2f}s")
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.reload()
+            except Exception as error:
+                self.log(f"Index reload check failed: {error}")
+
+    def close(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+    def stats(self) -> dict:
+        current: Optional[IndexVersion] = self._current
+        return {
+            "active_version": current.version if current else None,
+            "count": current.index.ntotal if current else 0,
+            "reloads": self._reloads,
+            "reload_failures": self._reload_failures,
+            "last_reload_seconds": self._last_reload_seconds,
+            "loaded_at": self._loaded_at,
+        }
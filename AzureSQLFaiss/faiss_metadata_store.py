@@ -0,0 +1,111 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Memory-mapped side store for the metadata of FAISS hits.
+
+Each column is kept as a UTF-8 string heap plus a little-endian int64 offsets
+file with one entry per row and a final end offset, so value i of a column is
+heap[offsets[i]:offsets[i + 1]]. Both files are written as rows stream in and
+read through mmap, so opening the store costs the same for any corpus size and
+only the pages behind the k hits of a query are ever touched.
+"""
+
+import json
+import mmap
+import os
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+SCHEMA_FILE = "metadata.json"
+
+
+def _value_bytes(value) -> bytes:
+    if value is None:
+        return b""
+    return (value if isinstance(value, str) else str(value)).encode("utf-8")
+
+
+class MetadataWriter:
+    """Appends rows (sequences in the order of columns) to a new store in directory."""
+
+    def __init__(self, directory: str, columns: Sequence[str]):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.columns = list(columns)
+        self.count = 0
+        self._heaps = [open(os.path.join(directory, f"{i}.heap"), "wb") for i in range(len(self.columns))]
+        self._offsets = [open(os.path.join(directory, f"{i}.offsets"), "wb") for i in range(len(self.columns))]
+        self._ends = [0] * len(self.columns)
+        for offsets in self._offsets:
+            offsets.write(np.zeros(1, dtype="<i8").tobytes())
+
+    def append(self, rows: Iterable[Sequence]):
+        rows = list(rows)
+        for i, (heap, offsets) in enumerate(zip(self._heaps, self._offsets)):
+            values = [_value_bytes(row[i]) for row in rows]
+            ends = self._ends[i] + np.cumsum([len(value) for value in values], dtype=np.int64)
+            heap.write(b"".join(values))
+            offsets.write(ends.astype("<i8").tobytes())
+            if len(ends):
+                self._ends[i] = int(ends[-1])
+        self.count += len(rows)
+
+    def close(self):
+        for f in self._heaps + self._offsets:
+            f.close()
+        with open(os.path.join(self.directory, SCHEMA_FILE), "w") as f:
+            json.dump({"columns": self.columns, "count": self.count}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MetadataStore:
+    """Read side of a store written by MetadataWriter; files are mapped on first access."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, SCHEMA_FILE)) as f:
+            schema = json.load(f)
+        self.columns = schema["columns"]
+        self.count = schema["count"]
+        self._mapped = None
+
+    def _map(self):
+        if self._mapped is None:
+            mapped = []
+            for i in range(len(self.columns)):
+                offsets = np.memmap(os.path.join(self.directory, f"{i}.offsets"), dtype="<i8", mode="r")
+                with open(os.path.join(self.directory, f"{i}.heap"), "rb") as f:
+                    # mmap refuses empty files; an all-empty column needs no heap anyway.
+                    heap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+                mapped.append((offsets, heap))
+            self._mapped = mapped
+        return self._mapped
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, row: int) -> Dict[str, str]:
+        if not 0 <= row < self.count:
+            raise IndexError(f"row {row} out of range for a store of {self.count} rows")
+        values = {}
+        for column, (offsets, heap) in zip(self.columns, self._map()):
+            values[column] = heap[int(offsets[row]):int(offsets[row + 1])].decode("utf-8")
+        return values
+
+    def hydrate(self, ids: Iterable[int]) -> List[Dict[str, str]]:
+        """Rows for FAISS result ids, skipping the -1 FAISS returns for missing hits."""
+        return [self.get(int(i)) for i in ids if i != -1]
+
+    def close(self):
+        if self._mapped is not None:
+            for _, heap in self._mapped:
+                if isinstance(heap, mmap.mmap):
+                    heap.close()
+            self._mapped = None
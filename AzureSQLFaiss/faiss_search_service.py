@@ -0,0 +1,145 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Micro-batching search service over a SentenceTransformer model and a FAISS index.
+
+Encoding one query and searching a batch of one leaves most of the BLAS work of
+both libraries unused. Callers here submit single queries from any thread; a
+worker collects them for up to max_wait_ms or max_batch_size queries, runs one
+batched encode and one batched index.search, and hands each caller its own row
+of the result. A larger max_wait_ms raises throughput under load at the cost of
+added latency per query; a lone caller also waits the full max_wait_ms, so set
+it to 0 when queries do not arrive concurrently.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, List, NamedTuple
+
+import numpy as np
+
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 5.0
+
+
+class SearchResult(NamedTuple):
+    scores: np.ndarray
+    ids: np.ndarray
+    # IndexVersion the query ran against when searching through an IndexHolder, else None.
+    version: Any
+
+
+class _Request:
+    __slots__ = ("text", "top_n", "future", "submitted")
+
+    def __init__(self, text: str, top_n: int):
+        self.text = text
+        self.top_n = top_n
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class MicroBatchSearcher:
+    """
+    Thread-safe front end for model.encode and index.search.
+
+    index is a FAISS index or a faiss_index_holder.IndexHolder; with a holder every
+    batch runs against the version that is current when the batch starts. search
+    returns a SearchResult for one query, where ids are positions in the index
+    (-1 where fewer than top_n vectors matched), ordered best first.
+    """
+
+    def __init__(self, model, index, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self.model = model
+        self.index = index
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._queries = 0
+        self._max_batch = 0
+        self._queue_seconds_total = 0.0
+        self._batch_seconds_total = 0.0
+        self._worker = threading.Thread(target=self._run, name="faiss-search", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str, top_n: int = 5) -> Future:
+        if self._closed:
+            raise RuntimeError("search service is closed")
+        request = _Request(text, top_n)
+        self._queue.put(request)
+        return request.future
+
+    def search(self, text: str, top_n: int = 5) -> SearchResult:
+        return self.submit(text, top_n).result()
+
+    async def search_async(self, text: str, top_n: int = 5) -> SearchResult:
+        return await asyncio.wrap_future(self.submit(text, top_n))
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size and batch[-1] is not None:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = batch[-1] is None
+            batch = [request for request in batch if request is not None]
+            if batch:
+                self._search_batch(batch)
+            if stop:
+                return
+
+    def _search_batch(self, batch: List[_Request]):
+        started = time.perf_counter()
+        version = self.index.current() if hasattr(self.index, "current") else None
+        index = version.index if version is not None else self.index
+        try:
+            vectors = self.model.encode([request.text for request in batch], batch_size=len(batch),
+                                        convert_to_numpy=True, normalize_embeddings=True)
+            scores, ids = index.search(np.ascontiguousarray(vectors, dtype=np.float32),
+                                       max(request.top_n for request in batch))
+        except BaseException as error:
+            for request in batch:
+                request.future.set_exception(error)
+        else:
+            for row, request in enumerate(batch):
+                request.future.set_result(SearchResult(scores[row, :request.top_n], ids[row, :request.top_n], version))
+        finished = time.perf_counter()
+        with self._stats_lock:
+            self._batches += 1
+            self._queries += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            self._queue_seconds_total += sum(started - request.submitted for request in batch)
+            self._batch_seconds_total += finished - started
+
+    def close(self):
+        """Finish the queued queries and stop the worker."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "queries": self._queries,
+                "batches": self._batches,
+                "mean_batch_size": self._queries / self._batches if self._batches else 0.0,
+                "max_batch_size": self._max_batch,
+                "mean_queue_ms": self._queue_seconds_total * 1000 / self._queries if self._queries else 0.0,
+                "mean_batch_ms": self._batch_seconds_total * 1000 / self._batches if self._batches else 0.0,
+            }
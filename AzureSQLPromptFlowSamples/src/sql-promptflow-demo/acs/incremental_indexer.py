@@ -0,0 +1,206 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Incremental re-indexing of the product search index driven by SQL change tracking.
+
+A full rebuild re-reads and re-embeds the whole catalog. This module remembers the
+last synced CHANGE_TRACKING_CURRENT_VERSION, asks CHANGETABLE(CHANGES ...) which
+products changed since then, and only re-embeds documents whose embedded text
+(description and category name) actually changed, so a nightly sync costs work
+proportional to the churn.
+
+Change tracking must be enabled on the database and on every table a document is
+built from, e.g.:
+
+    ALTER DATABASE CURRENT SET CHANGE_TRACKING = ON (CHANGE_RETENTION = 7 DAYS, AUTO_CLEANUP = ON);
+    ALTER TABLE SalesLT.Product ENABLE CHANGE_TRACKING;
+    ALTER TABLE SalesLT.ProductCategory ENABLE CHANGE_TRACKING;
+    ALTER TABLE SalesLT.ProductModelProductDescription ENABLE CHANGE_TRACKING;
+    ALTER TABLE SalesLT.ProductDescription ENABLE CHANGE_TRACKING;
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Callable, Dict, List, Optional
+
+import pyodbc
+
+from product_indexer import BatchEmbedder, PRODUCT_QUERY, add_vectors, category_text, description_text
+
+# Changes of the joined tables are mapped back to the products whose documents they are part of.
+CHANGED_PRODUCTS_QUERY = """SELECT CT.ProductID
+FROM CHANGETABLE(CHANGES SalesLT.Product, ?) AS CT
+UNION
+SELECT SP.ProductID
+FROM CHANGETABLE(CHANGES SalesLT.ProductCategory, ?) AS CT
+INNER JOIN SalesLT.Product SP ON SP.ProductCategoryID = CT.ProductCategoryID
+UNION
+SELECT SP.ProductID
+FROM CHANGETABLE(CHANGES SalesLT.ProductModelProductDescription, ?) AS CT
+INNER JOIN SalesLT.Product SP ON SP.ProductModelID = CT.ProductModelID
+UNION
+SELECT SP.ProductID
+FROM CHANGETABLE(CHANGES SalesLT.ProductDescription, ?) AS CT
+INNER JOIN SalesLT.ProductModelProductDescription PMPD ON PMPD.ProductDescriptionID = CT.ProductDescriptionID
+INNER JOIN SalesLT.Product SP ON SP.ProductModelID = PMPD.ProductModelID"""
+
+PRODUCTS_BY_ID_QUERY = PRODUCT_QUERY + """
+AND SP.ProductID IN (SELECT id FROM OPENJSON(?) WITH (id int '$'))"""
+
+# Oldest version still answerable by CHANGETABLE for all tracked tables; below it the
+# changes were cleaned up. The newest of the per-table minimums bounds all of them.
+MIN_VALID_VERSION_QUERY = """SELECT MAX(v) FROM (VALUES
+    (CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('SalesLT.Product'))),
+    (CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('SalesLT.ProductCategory'))),
+    (CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('SalesLT.ProductModelProductDescription'))),
+    (CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('SalesLT.ProductDescription')))) AS t(v)"""
+
+
+def content_hash(doc: dict) -> str:
+    """Hash of the texts that are embedded; other fields can change without re-embedding."""
+    raw = "\x1f".join((description_text(doc), category_text(doc)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SqlChangeSource:
+    """Reads change-tracking versions and product rows from Azure SQL."""
+
+    def __init__(self, connection_string: str, connect: Callable = pyodbc.connect):
+        self.connection_string = connection_string
+        self._connect = connect
+
+    def _query(self, sql: str, *params) -> list:
+        conn = self._connect(self.connection_string)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, *params)
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def _scalar(self, sql: str):
+        row = self._query(sql)[0]
+        return next(iter(row.values()))
+
+    def current_version(self) -> int:
+        return self._scalar("SELECT CHANGE_TRACKING_CURRENT_VERSION() AS version")
+
+    def min_valid_version(self) -> Optional[int]:
+        """None when change tracking is not enabled on the tracked tables."""
+        return self._scalar(MIN_VALID_VERSION_QUERY)
+
+    def changed_product_ids(self, since_version: int) -> List[int]:
+        return [row["ProductID"] for row in self._query(CHANGED_PRODUCTS_QUERY, *[since_version] * 4)]
+
+    def fetch_products(self, product_ids: Optional[List[int]] = None) -> List[dict]:
+        """Current rows for the given products, or for the whole catalog when ids is None."""
+        if product_ids is None:
+            rows = self._query(PRODUCT_QUERY)
+        else:
+            rows = self._query(PRODUCTS_BY_ID_QUERY, json.dumps(sorted(product_ids)))
+        for doc in rows:
+            doc["ProductId"] = str(doc["ProductId"])
+            if doc.get("ListPrice") is not None:
+                doc["ListPrice"] = float(doc["ListPrice"])
+        return rows
+
+
+class SyncState:
+    """Last synced version plus the content hash of every indexed document, kept in a JSON file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = None
+        self.hashes = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            self.version = saved["version"]
+            self.hashes = saved["hashes"]
+
+    def save(self):
+        # Write-then-rename so an interrupted sync never leaves a truncated state file.
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": self.version, "hashes": self.hashes}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class IncrementalIndexer:
+    """
+    Brings the search index up to date with the database.
+
+    send(documents, action) pushes documents to the index, where action is
+    "upload", "merge_or_upload" or "delete"; product_indexer.upload_documents
+    bound to an endpoint, index and credential fits.
+    """
+
+    def __init__(self, source: SqlChangeSource, embedder: BatchEmbedder, send: Callable[[List[dict], str], dict],
+                 state: SyncState):
+        self.source = source
+        self.embedder = embedder
+        self.send = send
+        self.state = state
+
+    def sync(self) -> Dict[str, int]:
+        # Read the version before the changes, so rows changed during the sync are
+        # picked up again next time rather than skipped.
+        current_version = self.source.current_version()
+        full = self.state.version is None
+        if not full:
+            # No minimum means the changes cannot be read at all; reload everything.
+            min_valid_version = self.source.min_valid_version()
+            full = min_valid_version is None or min_valid_version > self.state.version
+        if full:
+            products = self.source.fetch_products()
+            deleted_ids = set(self.state.hashes) - {doc["ProductId"] for doc in products}
+        else:
+            changed_ids = self.source.changed_product_ids(self.state.version)
+            products = self.source.fetch_products(changed_ids) if changed_ids else []
+            deleted_ids = ({str(i) for i in changed_ids} - {doc["ProductId"] for doc in products}) & set(self.state.hashes)
+
+        to_embed, to_merge = [], []
+        for doc in products:
+            digest = content_hash(doc)
+            if self.state.hashes.get(doc["ProductId"]) == digest:
+                to_merge.append(doc)
+            else:
+                to_embed.append(doc)
+            doc["_hash"] = digest
+
+        results = []
+        if to_embed:
+            add_vectors(to_embed, self.embedder)
+            results.append(self.send([_without_hash(doc) for doc in to_embed], "upload"))
+        if to_merge:
+            # Merging leaves the stored vectors of the documents untouched.
+            results.append(self.send([_without_hash(doc) for doc in to_merge], "merge_or_upload"))
+        if deleted_ids:
+            results.append(self.send([{"ProductId": product_id} for product_id in sorted(deleted_ids)], "delete"))
+        failed = sum(result.get("failed", 0) for result in results if result)
+        if failed:
+            # Keep the old version so the next run retries the same changes.
+            raise RuntimeError(f"{failed} documents were rejected by the search index, sync state not advanced")
+
+        for doc in products:
+            self.state.hashes[doc["ProductId"]] = doc["_hash"]
+        for product_id in deleted_ids:
+            self.state.hashes.pop(product_id, None)
+        self.state.version = current_version
+        self.state.save()
+
+        return {"full_sync": int(full), "embedded": len(to_embed), "merged": len(to_merge),
+                "deleted": len(deleted_ids), "version": current_version}
+
+
+def _without_hash(doc: dict) -> dict:
+    return {key: value for key, value in doc.items() if key != "_hash"}
@@ -0,0 +1,196 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Build the documents of the promptflow-demo product search index.
+
+Products are read from Azure SQL in chunks, every distinct text (descriptions and
+category names) is embedded exactly once, and the embedding requests carry many
+inputs each and run concurrently under a requests/tokens-per-minute budget. The
+documents are then uploaded through SearchIndexingBufferedSender in chunks.
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pyodbc
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+# Token counting is shared with the flow.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "promptflow_v2"))
+from token_count import count_tokens  # noqa: E402
+
+EMBEDDING_DEPLOYMENT = "text-embedding-ada-002"
+# Same version the notebook's query embeddings use; override it like the endpoint, from the environment.
+EMBEDDING_API_VERSION = os.environ.get("OPENAI_API_VERSION_Embeddings", "2023-03-15-preview")
+# Azure OpenAI accepts up to 16 inputs per ada-002 embedding request.
+EMBEDDING_BATCH_SIZE = 16
+EMBEDDING_CONCURRENCY = 4
+# Match these to the quota of the embedding deployment.
+REQUESTS_PER_MINUTE = 240
+TOKENS_PER_MINUTE = 240_000
+FETCH_BATCH_SIZE = 1000
+UPLOAD_CHUNK_SIZE = 500
+
+# Same product query the indexing notebook has always used.
+PRODUCT_QUERY = """SELECT PC.Name AS ProductCategoryName, SP.ProductId, SP.Name, SP.ProductNumber, SP.Color, SP.ListPrice, SP.Size, SP.ProductCategoryID, SP.ProductModelID, PD.ProductDescriptionID, PD.Description
+from [SalesLT].[Product] SP
+INNER JOIN SalesLT.ProductCategory PC ON PC.ProductCategoryID = SP.ProductCategoryID
+INNER JOIN [SalesLT].[ProductModelProductDescription] PMPD ON PMPD.ProductModelID = SP.ProductModelID
+INNER JOIN [SalesLT].[ProductDescription] PD ON PD.ProductDescriptionID = PMPD.ProductDescriptionID
+WHERE PMPD.Culture = 'en'"""
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute, shared by the worker threads."""
+
+    def __init__(self, requests_per_minute: int = REQUESTS_PER_MINUTE, tokens_per_minute: int = TOKENS_PER_MINUTE):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int):
+        # A single request larger than the whole budget would wait forever otherwise.
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill_locked()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max((1 - self._requests) * 60 / self.requests_per_minute,
+                           (tokens - self._tokens) * 60 / self.tokens_per_minute)
+            time.sleep(max(wait, 0.01))
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class BatchEmbedder:
+    """Embeds many texts with multi-input requests, bounded concurrency and a rate limit."""
+
+    def __init__(self, api_base: str, api_key: str, deployment: str = EMBEDDING_DEPLOYMENT,
+                 api_version: str = EMBEDDING_API_VERSION, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 concurrency: int = EMBEDDING_CONCURRENCY, rate_limiter: Optional[RateLimiter] = None):
+        self.url = f"{api_base.rstrip('/')}/openai/deployments/{deployment}/embeddings"
+        self.api_version = api_version
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self._session = requests.Session()
+        self._session.headers["api-key"] = api_key
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    @retry(retry=retry_if_exception(_is_retryable), wait=wait_random_exponential(min=1, max=20),
+           stop=stop_after_attempt(6), reraise=True)
+    def _embed_batch(self, texts: List[str]) -> List[list]:
+        self.rate_limiter.acquire(sum(count_tokens(t) for t in texts))
+        response = self._session.post(self.url, params={"api-version": self.api_version},
+                                      json={"input": texts}, timeout=60)
+        response.raise_for_status()
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    def embed(self, texts: Iterable[str], progress: Optional[Callable[[int], None]] = None) -> Dict[str, list]:
+        """Return {text: vector} for the distinct texts given; duplicates are embedded once."""
+        unique = list(dict.fromkeys(t for t in texts if t))
+        batches = [unique[i:i + self.batch_size] for i in range(0, len(unique), self.batch_size)]
+        vectors = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool:
+            for batch, embeddings in zip(batches, pool.map(self._embed_batch, batches)):
+                vectors.update(zip(batch, embeddings))
+                if progress is not None:
+                    progress(len(batch))
+        return vectors
+
+
+def fetch_products(connection_string: str, query: str = PRODUCT_QUERY, params: tuple = (),
+                   batch_size: int = FETCH_BATCH_SIZE) -> List[dict]:
+    """Read the products to index, with the index key (ProductId) as a string."""
+    conn = pyodbc.connect(connection_string)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, *params)
+        columns = [col[0] for col in cursor.description]
+        products = []
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                doc = dict(zip(columns, row))
+                doc["ProductId"] = str(doc["ProductId"])
+                if doc.get("ListPrice") is not None:
+                    doc["ListPrice"] = float(doc["ListPrice"])
+                products.append(doc)
+        return products
+    finally:
+        conn.close()
+
+
+def description_text(doc: dict) -> str:
+    return (doc.get("Description") or "").strip()
+
+
+def category_text(doc: dict) -> str:
+    return doc.get("ProductCategoryName") or ""
+
+
+def add_vectors(products: List[dict], embedder: BatchEmbedder,
+                progress: Optional[Callable[[int], None]] = None) -> List[dict]:
+    """Attach DescriptionVector and ProductCategoryNameVector to every product document."""
+    texts = [description_text(doc) for doc in products] + [category_text(doc) for doc in products]
+    vectors = embedder.embed(texts, progress=progress)
+    for doc in products:
+        doc["DescriptionVector"] = vectors.get(description_text(doc))
+        doc["ProductCategoryNameVector"] = vectors.get(category_text(doc))
+    return products
+
+
+def upload_documents(endpoint: str, index_name: str, credential, documents: List[dict],
+                     chunk_size: int = UPLOAD_CHUNK_SIZE, action: str = "upload") -> dict:
+    """
+    Send documents through SearchIndexingBufferedSender in chunks of chunk_size.
+
+    action is "upload", "merge_or_upload" or "delete". Returns counts of the
+    documents the service accepted and rejected.
+    """
+    from azure.search.documents import SearchIndexingBufferedSender
+
+    result = {"succeeded": 0, "failed": 0}
+
+    def on_progress(action_item):
+        result["succeeded"] += 1
+
+    def on_error(action_item):
+        result["failed"] += 1
+
+    with SearchIndexingBufferedSender(endpoint=endpoint, index_name=index_name, credential=credential,
+                                      auto_flush=True, initial_batch_action_count=chunk_size,
+                                      on_progress=on_progress, on_error=on_error) as sender:
+        send = getattr(sender, f"{action}_documents")
+        for i in range(0, len(documents), chunk_size):
+            send(documents=documents[i:i + chunk_size])
+    return result
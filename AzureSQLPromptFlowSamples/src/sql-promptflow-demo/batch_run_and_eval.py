@@ -62,6 +62,30 @@ base_run = pf.run(
 details = pf.get_details(base_run)
 pf.visualize(base_run)
 
+# %%
+# The v2 flow resolves the customers of all lines, and their orders, with one query each per worker
+# instead of per line; it gets the distinct customer names of the run for that.
+print("Batch run of the v2 flow..")
+flow_v2_path = "./promptflow_v2"
+with open(data_path) as f:
+    batch_customers = sorted({json.loads(line)["customer"] for line in f if line.strip()})
+
+v2_run = pf.run(
+    flow=flow_v2_path,
+    data=data_path,
+    runtime=runtime,
+    stream=True,
+    column_mapping={
+        "chat_history": "${data.chat_history}",
+        "question": "${data.question}",
+        "customer": "${data.customer}",
+        "batch_customers": json.dumps(batch_customers)
+    }
+)
+
+details = pf.get_details(v2_run)
+pf.visualize(v2_run)
+
 # %%
 # set eval flow path
 eval_flow = "./evaluation"
@@ -122,3 +146,21 @@ print(json.dumps(metrics, indent=4))
 pf.visualize([base_run, eval_run])
 
 # %%
+# evaluate the v2 run the same way
+eval_run_v2 = pf.run(
+    flow=eval_flow,
+    data=data,
+    run=v2_run,
+    runtime=runtime,
+    column_mapping={
+        "question": "${data.question}",
+        "customer": "${data.customer}",
+        "answer": "${run.outputs.answer}",
+        "context": "${run.outputs.retrieved_documents}"
+    }
+)
+pf.stream(eval_run_v2)
+print(json.dumps(pf.get_metrics(eval_run_v2), indent=4))
+pf.visualize([v2_run, eval_run_v2])
+
+# %%
@@ -0,0 +1,110 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Benchmark per-call connections against the shared keep-alive HTTP session.
+
+Starts a local stub of the ACS search endpoint and times search calls made the
+old way (requests.post, a fresh connection each time) and through the shared
+client in promptflow_v2/http_session.py, blocking and async. Every async call
+runs in an asyncio.run loop of its own, as promptflow runs the lines of async
+tools. The stub sleeps once per new connection to stand in for the TCP + TLS
+handshake of the real service, and counts the connections:
+
+    python benchmarks/search_session_benchmark.py --calls 200 --handshake-ms 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "promptflow_v2"))
+import search_client  # noqa: E402
+
+STUB_RESPONSE = json.dumps({"value": [{"ProductId": str(700 + i), "Name": f"Product {i}"} for i in range(5)]}).encode()
+
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY, keep-alive
+    # connections stall on delayed ACKs, which a real server would not do.
+    disable_nagle_algorithm = True
+    handshake_seconds = 0.0
+    connections = 0
+
+    def setup(self):
+        # Called once per accepted connection, keep-alive requests skip it.
+        super().setup()
+        StubSearchHandler.connections += 1
+        time.sleep(self.handshake_seconds)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def per_call_connection(url: str, body: dict):
+    return requests.post(url, params={"api-version": search_client.SEARCH_API_VERSION}, json=body).json()["value"]
+
+
+def shared_session(body: dict):
+    return search_client.search_products(body["search"], "stub-key", body["vector"]["value"], body["top"])
+
+
+def shared_session_async(body: dict):
+    return asyncio.run(search_client.search_products_async(body["search"], "stub-key", body["vector"]["value"],
+                                                           body["top"]))
+
+
+def run(name: str, fn, calls: int):
+    connections = StubSearchHandler.connections
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<24} calls={calls:<6} median={statistics.median(timings) * 1000:7.2f} ms "
+          f"p95={p95 * 1000:7.2f} ms total={sum(timings):6.2f} s "
+          f"connections={StubSearchHandler.connections - connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=30.0)
+    args = parser.parse_args()
+
+    StubSearchHandler.handshake_seconds = args.handshake_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSearchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    search_client.SEARCH_ENDPOINT = f"http://127.0.0.1:{server.server_port}"
+
+    _, _, body = search_client._search_request("best selling products", "stub-key", [0.0] * 1536, 5)
+    url = search_client._search_url()
+    try:
+        run("requests.post per call", lambda: per_call_connection(url, body), args.calls)
+        run("shared keep-alive", lambda: shared_session(body), args.calls)
+        run("shared keep-alive async", lambda: shared_session_async(body), args.calls)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
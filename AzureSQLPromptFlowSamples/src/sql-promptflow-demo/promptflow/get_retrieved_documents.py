@@ -3,10 +3,19 @@
 
 from promptflow import tool
 
+from context_assembler import CONTEXT_LAYOUT, CONTEXT_TOKEN_BUDGET, assemble_context
+
 # The inputs section will change based on the arguments of the tool function, after you save the code
 # Adding type to arguments and return value will help the system show the types properly
 # Please update the function name/signature per need
 @tool
-def my_python_tool(input1: list, input2: list, input3: list, input4: list) -> str:
-  retrieved_documents = input1 + input2 + input3 + input4
-  return retrieved_documents
\ No newline at end of file
+def my_python_tool(input1: list, input2: list, input3: list, input4: list,
+                   token_budget: int = CONTEXT_TOKEN_BUDGET, layout: str = CONTEXT_LAYOUT) -> dict:
+  # Returns {"context": compact text for the chat prompt, "tokens": what packing saved}
+  retrieved_documents = assemble_context([
+                          ("Customer", input1),
+                          ("Products", input3),
+                          ("Previous purchases", input2),
+                          ("Product sales counts", input4),
+                        ], token_budget, layout=layout)
+  return retrieved_documents
@@ -2,10 +2,9 @@
 # Licensed under the MIT license.
 
 from promptflow import tool
-import pandas as pd
 from promptflow.connections import CustomConnection 
-import pyodbc
-import json
+
+from sql_executor import execute_sql
 
 @tool
 def get_customer_details(inputs: dict, conn: CustomConnection):
@@ -14,22 +13,15 @@ def get_customer_details(inputs: dict, conn: CustomConnection):
        inputs_dict = eval(inputs)
     else:
        inputs_dict = inputs
-    if inputs_dict['MiddleName'] == "":
-      sqlQuery = f"""select * from [SalesLT].[Customer] WHERE FirstName='{inputs_dict['FirstName']}' and MiddleName is NULL and LastName='{inputs_dict['LastName']}'"""
-    else: 
-      sqlQuery = f"""select * from [SalesLT].[Customer] WHERE FirstName='{inputs_dict['FirstName']}' and MiddleName='{inputs_dict['MiddleName']}' and LastName='{inputs_dict['LastName']}'"""
-    connectionString = conn['connectionString']
-    sqlConn = pyodbc.connect(connectionString) 
-    cursor = sqlConn.cursor()
-    queryResult = pd.DataFrame()
+    # a single statement for both shapes of the name; an empty middle name matches NULL
+    sqlQuery = """select * from [SalesLT].[Customer] WHERE FirstName = ? and LastName = ?
+      and (MiddleName = ? or (? = '' and MiddleName is NULL))"""
+    middle_name = inputs_dict['MiddleName']
+    customer_detail_json = []
     try:
-      cursor.execute(sqlQuery)
-      records = cursor.fetchall()
-      queryResult = pd.DataFrame.from_records(records, columns=[col[0] for col in cursor.description])
+      customer_detail_json = execute_sql(sqlQuery, conn['connectionString'],
+                                         params=(inputs_dict['FirstName'], inputs_dict['LastName'], middle_name, middle_name))
     except Exception as e:
       print(f"connection could not be established: {e}")
-    finally:
-      cursor.close()
-    
-    customer_detail_json = json.loads(queryResult.to_json(orient='records'))
+
     return customer_detail_json
\ No newline at end of file
@@ -0,0 +1,123 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Semantic cache of chat answers.
+
+The chat node runs at temperature 0, so the same question over the same prompt
+gets the same answer, and production traffic repeats many questions with small
+wording differences. An answer is reused when the retrieved context, customer
+and chat history hash the same as when it was stored and the question embedding
+is at least ANSWER_CACHE_SIMILARITY close (cosine) to the stored question. The
+question embedding is the one get_product already computed, served from the
+embedding cache. Entries expire after a TTL and the cache is a size-bounded LRU.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+# Minimum cosine similarity of two question embeddings for one answer to serve both.
+ANSWER_CACHE_SIMILARITY = 0.97
+ANSWER_CACHE_TTL_SECONDS = 600
+ANSWER_CACHE_MAX_ENTRIES = 4096
+
+
+def prompt_hash(retrieved_context: str, chat_history: list, customer) -> str:
+    """Hash of everything besides the question that goes into the chat prompt."""
+    raw = json.dumps([retrieved_context, chat_history, customer], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, similarity: float = ANSWER_CACHE_SIMILARITY, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.similarity = similarity
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (prompt hash, normalized question) -> (expires_at, unit vector, answer)
+        self._entries = OrderedDict()
+        # prompt hash -> keys of its entries; only these are compared with a question.
+        self._by_prompt = {}
+        self._metrics = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def _unit(vector: list) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop_locked(self, key: tuple):
+        self._entries.pop(key, None)
+        keys = self._by_prompt.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_prompt[key[0]]
+
+    def get(self, prompt: str, vector: list) -> Tuple[Optional[str], Optional[float]]:
+        """The cached answer closest to the question under the same prompt, and its similarity."""
+        query = self._unit(vector)
+        now = time.monotonic()
+        best_key, best_similarity = None, -1.0
+        with self._lock:
+            for key in list(self._by_prompt.get(prompt, ())):
+                expires_at, stored, _ = self._entries[key]
+                if expires_at <= now:
+                    self._drop_locked(key)
+                    self._metrics["expired"] += 1
+                    continue
+                similarity = float(np.dot(query, stored))
+                if similarity > best_similarity:
+                    best_key, best_similarity = key, similarity
+            if best_key is None or best_similarity < self.similarity:
+                self._metrics["misses"] += 1
+                return None, best_similarity if best_key is not None else None
+            self._entries.move_to_end(best_key)
+            self._metrics["hits"] += 1
+            return self._entries[best_key][2], best_similarity
+
+    def put(self, prompt: str, question: str, vector: list, answer: str):
+        key = (prompt, normalize_text(question))
+        with self._lock:
+            self._drop_locked(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, self._unit(vector), answer)
+            self._by_prompt.setdefault(prompt, set()).add(key)
+            self._metrics["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop_locked(next(iter(self._entries)))
+                self._metrics["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_prompt.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._metrics)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
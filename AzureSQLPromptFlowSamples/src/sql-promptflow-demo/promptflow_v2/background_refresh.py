@@ -0,0 +1,106 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Per-database values that are loaded once and then refreshed in the background.
+
+The catalog snapshot, the sales leaderboard and the customer index are each
+read from SQL by the first request of a worker that needs them, and that
+request waits for the load. Later requests get the value at hand and, every
+refresh_seconds, start the next refresh on a daemon thread, one at a time. A
+failed refresh keeps the previous value and is tried again refresh_seconds
+later.
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from typing import Callable, Generic, TypeVar
+
+from sql_query_store import run_query
+
+T = TypeVar("T")
+
+
+class BackgroundRefresh(Generic[T]):
+    """Holds the current value of one database; subclasses implement load and may override refresh."""
+
+    thread_name = "background-refresh"
+
+    def __init__(self, sql_query_prep: dict, conn_string: str, refresh_seconds: float):
+        self.sql_query_prep = sql_query_prep
+        self.conn_string = conn_string
+        self.refresh_seconds = refresh_seconds
+        self._value = None
+        self._load_lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._last_refresh = 0.0
+        self._metrics = {"refresh_failures": 0}
+
+    def load(self) -> T:
+        """Read the whole value from the database."""
+        raise NotImplementedError
+
+    def refresh(self, value: T) -> T:
+        """The value to serve after value; by default it is read again."""
+        return self.load()
+
+    def _query(self, name: str, *params) -> list:
+        return run_query(self.sql_query_prep, name, self.conn_string, *params)
+
+    def _due(self) -> bool:
+        return time.monotonic() - self._last_refresh >= self.refresh_seconds
+
+    def _refresh(self):
+        try:
+            self._value = self.refresh(self._value)
+        except Exception:
+            # Keep serving the previous value; the next due call retries.
+            self._metrics["refresh_failures"] += 1
+        finally:
+            self._last_refresh = time.monotonic()
+            self._refreshing.release()
+
+    def current(self) -> T:
+        """The value; the first call loads it, later ones may start a background refresh."""
+        value = self._value
+        if value is None:
+            with self._load_lock:
+                if self._value is None:
+                    self._value = self.load()
+                    self._last_refresh = time.monotonic()
+                return self._value
+        if self._due() and self._refreshing.acquire(False):
+            # Check again under the lock: a refresh that finished since then must not be repeated.
+            if self._due():
+                threading.Thread(target=self._refresh, name=self.thread_name, daemon=True).start()
+            else:
+                self._refreshing.release()
+        return value
+
+    async def current_async(self) -> T:
+        if self._value is None:
+            # The first load blocks; run it off the event loop, under the caller's deadline.
+            current = functools.partial(contextvars.copy_context().run, self.current)
+            return await asyncio.get_running_loop().run_in_executor(None, current)
+        return self.current()
+
+
+class PerDatabase(Generic[T]):
+    """The process-wide instance of a BackgroundRefresh class for each database, created on first use."""
+
+    def __init__(self, factory: Callable[[dict, str], T]):
+        self._factory = factory
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def get(self, sql_query_prep: dict, conn_string: str) -> T:
+        instance = self._instances.get(conn_string)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(conn_string)
+                if instance is None:
+                    instance = self._instances[conn_string] = self._factory(sql_query_prep, conn_string)
+        return instance
@@ -0,0 +1,132 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+In-memory snapshot of the product catalog for hydrating search hits.
+
+query_prod_byID re-evaluates the prod_detail CTE chain (four joins and a
+ROW_NUMBER over every product description) on each chat turn, for a catalog
+that changes a few times a day. The whole of prod_detail is loaded once per
+worker into column arrays sorted by ProductID, and hits are looked up with a
+binary search. The snapshot is reloaded in the background when the change
+tracking version of the database moves, or after CATALOG_MAX_AGE_SECONDS when
+change tracking is off; requests keep using the previous snapshot meanwhile.
+"""
+
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from background_refresh import BackgroundRefresh, PerDatabase
+
+# How often a request may trigger the cheap check of the change tracking version.
+CATALOG_VERSION_CHECK_SECONDS = 60
+# Reload at least this often, also when change tracking is not enabled.
+CATALOG_MAX_AGE_SECONDS = 3600
+
+# Columns of query_prod_byID, in its order.
+OUTPUT_COLUMNS = ("Name", "Category", "Color", "Size", "Weight", "ListPrice", "Description", "ProductCategoryID")
+_NUMERIC_COLUMNS = ("Weight", "ListPrice")
+
+
+class CatalogSnapshot:
+    """Immutable column arrays of prod_detail, indexed by ProductID."""
+
+    def __init__(self, rows: List[dict], version: Optional[int] = None):
+        rows = sorted(rows, key=lambda row: row["ProductID"])
+        self.version = version
+        self.loaded_at = time.time()
+        self.product_ids = np.array([row["ProductID"] for row in rows], dtype=np.int64)
+        self._columns = {}
+        for column in OUTPUT_COLUMNS:
+            if column in _NUMERIC_COLUMNS:
+                # NULL is kept as NaN and turned back into None on the way out.
+                values = [np.nan if row[column] is None else row[column] for row in rows]
+                self._columns[column] = np.array(values, dtype=np.float64)
+            elif column == "ProductCategoryID":
+                self._columns[column] = np.array([row[column] for row in rows], dtype=np.int64)
+            else:
+                self._columns[column] = np.array([row[column] for row in rows], dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def _row(self, position: int) -> dict:
+        row = {}
+        for column, values in self._columns.items():
+            value = values[position]
+            if column in _NUMERIC_COLUMNS:
+                value = None if np.isnan(value) else float(value)
+            elif column == "ProductCategoryID":
+                value = int(value)
+            row[column] = value
+        return row
+
+    def lookup(self, product_ids: List[int]) -> Tuple[List[dict], List[int]]:
+        """Rows of the given products in the order given, and the ids not in the snapshot."""
+        ids = np.asarray(product_ids, dtype=np.int64)
+        positions = np.searchsorted(self.product_ids, ids)
+        rows, missing = [], []
+        for product_id, position in zip(ids.tolist(), positions.tolist()):
+            if position < len(self.product_ids) and self.product_ids[position] == product_id:
+                rows.append(self._row(position))
+            else:
+                missing.append(product_id)
+        return rows, missing
+
+
+class ProductCatalog(BackgroundRefresh[CatalogSnapshot]):
+    """Holds the current CatalogSnapshot of one database and refreshes it in the background."""
+
+    thread_name = "catalog-refresh"
+
+    def __init__(self, sql_query_prep: dict, conn_string: str,
+                 version_check_seconds: float = CATALOG_VERSION_CHECK_SECONDS,
+                 max_age_seconds: float = CATALOG_MAX_AGE_SECONDS):
+        super().__init__(sql_query_prep, conn_string, version_check_seconds)
+        self.max_age_seconds = max_age_seconds
+        self._metrics.update({"loads": 0, "version_checks": 0, "last_load_seconds": None})
+
+    def _current_version(self) -> Optional[int]:
+        self._metrics["version_checks"] += 1
+        return self._query('query_change_version')[0]["version"]
+
+    def _load(self, version: Optional[int]) -> CatalogSnapshot:
+        start = time.perf_counter()
+        snapshot = CatalogSnapshot(self._query('query_prod_catalog'), version)
+        self._metrics["loads"] += 1
+        self._metrics["last_load_seconds"] = time.perf_counter() - start
+        return snapshot
+
+    def load(self) -> CatalogSnapshot:
+        # Read the version first so changes made during the load trigger another one.
+        return self._load(self._current_version())
+
+    def refresh(self, snapshot: CatalogSnapshot) -> CatalogSnapshot:
+        version = self._current_version()
+        if time.time() - snapshot.loaded_at >= self.max_age_seconds or version != snapshot.version:
+            return self._load(version)
+        return snapshot
+
+    def snapshot(self) -> CatalogSnapshot:
+        """The current snapshot; the first call loads it, later ones may start a background refresh."""
+        return self.current()
+
+    async def snapshot_async(self) -> CatalogSnapshot:
+        return await self.current_async()
+
+    def stats(self) -> dict:
+        stats = dict(self._metrics)
+        snapshot = self._value
+        stats["products"] = len(snapshot) if snapshot else 0
+        stats["version"] = snapshot.version if snapshot else None
+        stats["age_seconds"] = time.time() - snapshot.loaded_at if snapshot else None
+        return stats
+
+
+_catalogs = PerDatabase(ProductCatalog)
+
+
+def get_catalog(sql_query_prep: dict, conn_string: str) -> ProductCatalog:
+    return _catalogs.get(sql_query_prep, conn_string)
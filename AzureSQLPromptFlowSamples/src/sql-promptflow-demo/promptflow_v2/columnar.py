@@ -0,0 +1,58 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Columnar payloads passed between flow nodes.
+
+A list of dicts repeats every column name on every row, in the JSON promptflow
+passes between nodes, in the run records and in the prompt. A columnar payload
+names the columns once:
+
+    {"columns": ["Name", "Color", ...], "rows": [["Road-150 Red, 62", "Red", ...], ...]}
+
+Tools return it when their payload_format input is "columnar"; consumers call
+to_records, which accepts either shape, so they work with both.
+"""
+
+from typing import List, Sequence, Union
+
+RECORDS = "records"
+COLUMNAR = "columnar"
+
+
+def is_columnar(payload) -> bool:
+    return isinstance(payload, dict) and "columns" in payload and "rows" in payload
+
+
+def to_columnar(records: List[dict]) -> dict:
+    """Columns in order of first appearance; a row lacking a column gets None there."""
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    return {"columns": columns, "rows": [[record.get(column) for column in columns] for record in records]}
+
+
+def to_records(payload) -> list:
+    """Expand a columnar payload into a list of dicts; lists pass through unchanged."""
+    if is_columnar(payload):
+        columns = payload["columns"]
+        return [dict(zip(columns, row)) for row in payload["rows"]]
+    if isinstance(payload, list):
+        return payload
+    # Tools return {} when their query failed.
+    return []
+
+
+def to_payload(records, payload_format: str = RECORDS) -> Union[list, dict]:
+    """What a tool returns for its records in the requested payload format."""
+    if payload_format == COLUMNAR and isinstance(records, list):
+        return to_columnar(records)
+    return records
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def render_row(values: Sequence) -> str:
+    return " | ".join(_cell(value) for value in values)
@@ -0,0 +1,121 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Token-budgeted assembly of the retrieved data into one compact prompt context.
+
+The retrieved lists used to go into the prompt verbatim: every row as a dict with
+ids and other fields the model has no use for, and the same long product
+description repeated in the products, past orders and sales stats. Here every
+item becomes one "Field: value" line of the fields in CONTEXT_FIELDS, a product
+keeps its description only the first time it appears, descriptions are cut to
+DESCRIPTION_MAX_TOKENS, and items are packed into the token budget taking the
+best ranked item of every section in turn, so no section crowds out the others.
+With layout "table" each section is a pipe table instead, so the field names are
+written once per section rather than on every line.
+"""
+
+import json
+from typing import List, Tuple
+
+from columnar import render_row, to_records
+from token_count import count_tokens, truncate_tokens
+
+CONTEXT_TOKEN_BUDGET = 2000
+# "lines" renders "Field: value; ..." per item, "table" one pipe table per section.
+CONTEXT_LAYOUT = "lines"
+DESCRIPTION_MAX_TOKENS = 48
+# Fields rendered into the context, in this order; everything else is left out.
+CONTEXT_FIELDS = ("Title", "FirstName", "LastName", "CompanyName", "Name", "Category", "ProductCategoryName",
+                  "Color", "Size", "Weight", "ListPrice", "sales_count", "OrderQty", "OrderCount", "LastOrderDate",
+                  "Description")
+
+
+def _item_fields(item: dict, description_max_tokens: int, with_description: bool) -> dict:
+    fields = {}
+    for field in CONTEXT_FIELDS:
+        value = item.get(field)
+        if value is None or value == "" or (field == "Description" and not with_description):
+            continue
+        if field == "Description":
+            value = truncate_tokens(str(value).strip(), description_max_tokens)
+        fields[field] = value
+    return fields
+
+
+def render_item(item: dict, description_max_tokens: int = DESCRIPTION_MAX_TOKENS, with_description: bool = True) -> str:
+    fields = _item_fields(item, description_max_tokens, with_description)
+    return "- " + "; ".join(f"{field}: {value}" for field, value in fields.items())
+
+
+def assemble_context(sections: List[Tuple[str, list]], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                     description_max_tokens: int = DESCRIPTION_MAX_TOKENS, layout: str = CONTEXT_LAYOUT) -> dict:
+    """
+    Pack (title, items) sections, each ranked best first, into at most token_budget tokens.
+
+    items may be a list of dicts or a columnar payload. Returns the context text and a
+    report of the tokens the verbatim lists would have taken, the tokens of the context,
+    and how many items were kept.
+    """
+    sections = [(title, to_records(items)) for title, items in sections]
+    # Measured on the records, the verbatim JSON dump the context used to be.
+    raw_tokens = count_tokens(json.dumps({title: items for title, items in sections}, default=str))
+    headers = {title: f"# {title}:" for title, _ in sections}
+    columns = {}
+    if layout == "table":
+        for title, items in sections:
+            columns[title] = [field for field in CONTEXT_FIELDS
+                              if any(isinstance(item, dict) and item.get(field) not in (None, "") for item in items)]
+            if columns[title]:
+                headers[title] += "\n" + render_row(columns[title])
+    used = sum(count_tokens(header) + 1 for header in headers.values())
+
+    # A product's description goes with its first appearance in reading order.
+    describer = {}
+    for section, (_, items) in enumerate(sections):
+        for rank, item in enumerate(items):
+            if isinstance(item, dict) and item.get("Name") is not None and item.get("Description"):
+                describer.setdefault(item["Name"], (section, rank))
+
+    packed = {title: [] for title, _ in sections}
+    deduped = 0
+    for rank in range(max((len(items) for _, items in sections), default=0)):
+        for section, (title, items) in enumerate(sections):
+            if rank >= len(items) or not isinstance(items[rank], dict):
+                continue
+            item = items[rank]
+            name = item.get("Name")
+            with_description = name is None or describer.get(name) == (section, rank)
+            if layout == "table":
+                fields = _item_fields(item, description_max_tokens, with_description)
+                line = render_row([fields.get(field) for field in columns[title]])
+            else:
+                line = render_item(item, description_max_tokens, with_description)
+            cost = count_tokens(line) + 1
+            if used + cost > token_budget:
+                # Keep going, a shorter item further down may still fit.
+                continue
+            used += cost
+            packed[title].append((rank, line))
+            if not with_description and item.get("Description"):
+                deduped += 1
+
+    blocks = []
+    for title, _ in sections:
+        lines = [line for _, line in sorted(packed[title])] or ["- none"]
+        blocks.append("\n".join([headers[title]] + lines))
+    context = "\n\n".join(blocks)
+
+    context_tokens = count_tokens(context)
+    return {
+        "context": context,
+        "tokens": {
+            "raw": raw_tokens,
+            "context": context_tokens,
+            "saved": raw_tokens - context_tokens,
+            "budget": token_budget,
+            "items": sum(len(items) for _, items in sections),
+            "items_packed": sum(len(lines) for lines in packed.values()),
+            "descriptions_deduped": deduped,
+        },
+    }
@@ -0,0 +1,126 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Customers and order histories of a whole batch run, resolved with set-based queries.
+
+A batch run pushes every line of the data file through the flow, and each line
+used to look its customer up by name and then read that customer's orders: two
+round trips per line. batch_run_and_eval passes the distinct customer names of
+the run as the batch_customers input. The first line a worker runs then resolves
+all of them with one query joining a JSON list of names to SalesLT.Customer, and
+reads the orders of all of them in one more batch; the other lines are served
+from memory. Names that are not part of the batch fall back to the per-line
+queries.
+
+get_customer resolves names with the in-memory customer index and only reaches
+batch_customer when the index cannot be loaded; batch_orders serves get_orders
+on every line.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple, Union
+
+from customer_cache import CustomerCache
+from embedding_cache import normalize_text
+from sql_query_store import run_query_async, run_query_batch_async
+
+# A run's customers and orders stay in memory this long after they were read.
+BATCH_TTL_SECONDS = 3600
+# Batches of different runs (or order history settings) kept per worker.
+BATCH_MAX_ENTRIES = 8
+
+# Single flight: the lines of a run that start together share one load.
+_batches = CustomerCache(ttl_seconds=BATCH_TTL_SECONDS, max_entries=BATCH_MAX_ENTRIES)
+
+
+def _name_key(customer: str) -> Tuple[str, str]:
+    # Same split as get_customer: first word and last word.
+    names = customer.split()
+    return normalize_text(names[0]), normalize_text(names[-1])
+
+
+def _batch_id(batch_customers: Union[str, list]) -> str:
+    raw = batch_customers if isinstance(batch_customers, str) else json.dumps(batch_customers)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _names_param(batch_customers: Union[str, list]) -> Tuple[List[Tuple[str, str]], str]:
+    # promptflow may hand a list input over as its JSON text.
+    if isinstance(batch_customers, str):
+        batch_customers = json.loads(batch_customers)
+    names = {}
+    for customer in batch_customers:
+        parts = customer.split()
+        if parts:
+            # Normalized only to dedupe; SQL gets the names as written.
+            names.setdefault(_name_key(customer), {"FirstName": parts[0], "LastName": parts[-1]})
+    return sorted(names), json.dumps([names[key] for key in sorted(names)])
+
+
+async def _load_customers(sql_query_prep: dict, conn_string: str, batch_customers) -> Dict[tuple, list]:
+    keys, names = _names_param(batch_customers)
+    resolved = {key: [] for key in keys}
+    for row in await run_query_async(sql_query_prep, 'query_customers_by_name', conn_string, names):
+        resolved.setdefault((normalize_text(row["FirstName"]), normalize_text(row["LastName"])), []).append(row)
+    return resolved
+
+
+async def batch_customer(sql_query_prep: dict, conn_string: str, batch_customers, customer: str) -> Optional[list]:
+    """The query_customer rows of customer, read with the whole batch, or None if it is not in the batch."""
+    if not batch_customers or not customer.split():
+        return None
+    resolved = await _batches.get_or_load(
+        ("customers", conn_string, _batch_id(batch_customers)),
+        lambda: _load_customers(sql_query_prep, conn_string, batch_customers))
+    return resolved.get(_name_key(customer))
+
+
+async def _load_orders(sql_query_prep: dict, conn_string: str, batch_customers, order_history: str,
+                       max_rows: int) -> dict:
+    _, names = _names_param(batch_customers)
+    if order_history == "summary":
+        # Capped per customer in SQL; _merge_summaries caps the rows of a name again.
+        customers, rows = await run_query_batch_async(sql_query_prep, 'query_customer_order_summary_by_name',
+                                                      conn_string, names, names, max_rows)
+    else:
+        customers, rows = await run_query_batch_async(sql_query_prep, 'query_customer_orders_by_name', conn_string,
+                                                      names, names)
+    orders = {customer["CustomerID"]: [] for customer in customers}
+    for row in rows:
+        orders[row.pop("CustomerID")].append(row)
+    return orders
+
+
+def _merge_summaries(summaries: List[list], max_rows: int) -> list:
+    # query_order_summary aggregates over all ids of a name; add up the per customer rows the same way.
+    merged = {}
+    for rows in summaries:
+        for row in rows:
+            total = merged.get(row["Name"])
+            if total is None:
+                merged[row["Name"]] = dict(row)
+                continue
+            total["OrderQty"] += row["OrderQty"]
+            total["OrderCount"] += row["OrderCount"]
+            total["LastOrderDate"] = max(total["LastOrderDate"], row["LastOrderDate"])
+    rows = sorted(merged.values(), key=lambda row: row["OrderQty"], reverse=True)
+    rows.sort(key=lambda row: row["LastOrderDate"], reverse=True)
+    return rows[:max_rows]
+
+
+async def batch_orders(sql_query_prep: dict, conn_string: str, batch_customers, customer_ids: list,
+                       order_history: str, max_rows: int) -> Optional[list]:
+    """The orders get_orders returns for customer_ids, read with the whole batch, or None if one is not in it."""
+    if not batch_customers:
+        return None
+    orders = await _batches.get_or_load(
+        ("orders", order_history, max_rows, conn_string, _batch_id(batch_customers)),
+        lambda: _load_orders(sql_query_prep, conn_string, batch_customers, order_history, max_rows))
+    if any(customer_id not in orders for customer_id in customer_ids):
+        return None
+    customer_ids = list(dict.fromkeys(customer_ids))
+    if order_history == "summary":
+        return _merge_summaries([orders[customer_id] for customer_id in customer_ids], max_rows)
+    return [row for customer_id in customer_ids for row in orders[customer_id]]
@@ -0,0 +1,121 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Cache of get_customer lookups.
+
+The customer input stays the same for a whole conversation, so every chat turn
+used to repeat the same SELECT. Results are kept per (database, normalized first
+and last name) for a TTL in a size-bounded LRU, and concurrent misses for the same
+customer share one query (single flight) instead of each going to SQL.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Optional, Tuple
+
+from embedding_cache import normalize_text
+
+# How long a customer row is served from memory before it is read again.
+CUSTOMER_CACHE_TTL_SECONDS = 300
+CUSTOMER_CACHE_MAX_ENTRIES = 1024
+
+
+def customer_key(conn_string: str, first_name: str, last_name: str) -> Tuple[str, str, str]:
+    return conn_string, normalize_text(first_name), normalize_text(last_name)
+
+
+class CustomerCache:
+    def __init__(self, ttl_seconds: float = CUSTOMER_CACHE_TTL_SECONDS,
+                 max_entries: int = CUSTOMER_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (expires_at, rows)
+        self._entries = OrderedDict()
+        # key -> Future of the query in flight; a concurrent Future so waiters on
+        # other event loops (promptflow may run nodes on several) can await it too.
+        self._inflight = {}
+        # Bumped by invalidate; a load that started before it does not store its result.
+        self._generation = 0
+        self._metrics = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "invalidations": 0}
+
+    async def get_or_load(self, key: tuple, load: Callable[[], Awaitable[list]]) -> list:
+        """Cached rows for key, or the result of load(), run once however many callers miss together."""
+        now = time.monotonic()
+        leader = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._metrics["hits"] += 1
+                return entry[1]
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self._metrics["coalesced"] += 1
+            else:
+                self._metrics["misses"] += 1
+                inflight = self._inflight[key] = Future()
+                generation = self._generation
+                leader = True
+        if not leader:
+            return await asyncio.wrap_future(inflight)
+
+        try:
+            rows = await load()
+        except BaseException as error:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.set_exception(error)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, rows)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._metrics["evictions"] += 1
+        inflight.set_result(rows)
+        return rows
+
+    def invalidate(self, key: Optional[tuple] = None):
+        """Drop one customer, or everything when key is None, e.g. after the customer row changed."""
+        with self._lock:
+            self._generation += 1
+            self._metrics["invalidations"] += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._metrics)
+            stats["entries"] = len(self._entries)
+            stats["inflight"] = len(self._inflight)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_customer_cache() -> CustomerCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CustomerCache()
+    return _cache
+
+
+def invalidate_customer(conn_string: str, customer: str):
+    """Forget the cached lookup of a customer name; get_customer_cache().invalidate() forgets all."""
+    names = customer.split()
+    get_customer_cache().invalidate(customer_key(conn_string, names[0], names[-1]))
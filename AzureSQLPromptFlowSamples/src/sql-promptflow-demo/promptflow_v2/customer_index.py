@@ -0,0 +1,208 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+In-memory name index of SalesLT.Customer for get_customer.
+
+get_customer compared the first and last word of the input with FirstName and
+LastName for equality, so "A. Leonetti" or a typo found nobody, after a full
+round trip. Each worker keeps the customers in a NameIndex instead and resolves
+a name without SQL, trying in turn:
+
+- the exact first and last name (case, accents and spacing normalized),
+- an initial: "A. Leonetti" matches the Leonettis whose first name starts with "a",
+- trigram similarity of the whole name, for typos: only a single name scoring at
+  least TRIGRAM_MIN_SIMILARITY and TRIGRAM_MIN_MARGIN above the runner-up is
+  taken. "Donnie Blanton" does not become Donald Blanton; an ambiguous or weak
+  match finds nobody and is counted in the stats instead.
+
+The first lookup of a worker loads the index and waits for it, so a name
+resolves the same way on every line of a batch run. Afterwards rows modified
+since the last load are merged in the background every
+CUSTOMER_INDEX_REFRESH_SECONDS, and the whole table is read again after
+CUSTOMER_INDEX_MAX_AGE_SECONDS to drop deleted customers.
+"""
+
+import datetime
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from background_refresh import BackgroundRefresh, PerDatabase
+from embedding_cache import normalize_text
+
+# How often the rows modified since the last load are merged in.
+CUSTOMER_INDEX_REFRESH_SECONDS = 60
+# Full reload interval; incremental refreshes do not see deleted customers.
+CUSTOMER_INDEX_MAX_AGE_SECONDS = 3600
+# Minimum Jaccard similarity of the name trigrams for a fuzzy match; "Keith Haris" scores 0.79.
+TRIGRAM_MIN_SIMILARITY = 0.75
+# How far the best fuzzy match must be ahead of the next best name.
+TRIGRAM_MIN_MARGIN = 0.1
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _fold(name: Optional[str]) -> str:
+    # normalize_text plus accent folding, so "Jose Nunez" finds "José Núñez".
+    decomposed = unicodedata.normalize("NFKD", normalize_text(name or ""))
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _trigrams(text: str) -> Counter:
+    padded = f"  {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _initial(name: str) -> Optional[str]:
+    # "A." or "A" is an initial.
+    stripped = name.rstrip(".")
+    return stripped if len(stripped) == 1 else None
+
+
+class NameIndex:
+    """Immutable lookup structures over customer rows, keyed by CustomerID."""
+
+    def __init__(self, rows: Dict[int, dict], modified_through: Optional[int]):
+        self.rows = rows
+        # Largest ModifiedDate seen, as the epoch milliseconds execute_sql returns.
+        self.modified_through = modified_through
+        self.loaded_at = time.time()
+        self._by_name = {}
+        self._by_last = {}
+        self._by_trigram = {}
+        self._trigram_counts = {}
+        for customer_id, row in rows.items():
+            first, last = _fold(row["FirstName"]), _fold(row["LastName"])
+            self._by_name.setdefault((first, last), []).append(customer_id)
+            self._by_last.setdefault(last, []).append(customer_id)
+            trigrams = _trigrams(f"{first} {last}")
+            self._trigram_counts[customer_id] = sum(trigrams.values())
+            for trigram, count in trigrams.items():
+                self._by_trigram.setdefault(trigram, []).append((customer_id, count))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _fuzzy(self, first: str, last: str) -> Tuple[str, List[int]]:
+        trigrams = _trigrams(f"{first} {last}")
+        size = sum(trigrams.values())
+        shared = Counter()
+        for trigram, count in trigrams.items():
+            for customer_id, other in self._by_trigram.get(trigram, ()):
+                shared[customer_id] += min(count, other)
+        # Customers of the same name score the same; the name is what has to stand out.
+        similarities = {}
+        for customer_id, common in shared.items():
+            row = self.rows[customer_id]
+            name = (_fold(row["FirstName"]), _fold(row["LastName"]))
+            similarities[name] = common / (size + self._trigram_counts[customer_id] - common)
+        ranked = sorted(similarities.items(), key=lambda item: item[1], reverse=True)
+        if not ranked or ranked[0][1] < TRIGRAM_MIN_SIMILARITY:
+            return "none", []
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < TRIGRAM_MIN_MARGIN:
+            return "ambiguous", []
+        return "fuzzy", list(self._by_name[ranked[0][0]])
+
+    def match(self, customer: str) -> Tuple[str, List[int]]:
+        """
+        The kind of match ("exact", "initial", "fuzzy", "ambiguous" or "none") of a
+        "First [Middle] Last" name and its CustomerIDs, best kind of match only.
+        """
+        names = _fold(customer).split()
+        if not names:
+            return "none", []
+        first, last = names[0], names[-1]
+        customer_ids = self._by_name.get((first, last))
+        if customer_ids:
+            return "exact", list(customer_ids)
+        initial = _initial(first)
+        if initial is not None:
+            customer_ids = [customer_id for customer_id in self._by_last.get(last, ())
+                            if _fold(self.rows[customer_id]["FirstName"]).startswith(initial)]
+            if customer_ids:
+                return "initial", customer_ids
+        return self._fuzzy(first, last)
+
+    def resolve(self, customer: str) -> List[int]:
+        """CustomerIDs matching a name; [] if none or if a fuzzy match is ambiguous."""
+        return self.match(customer)[1]
+
+
+def _build(rows: Dict[int, dict]) -> NameIndex:
+    modified = [row["ModifiedDate"] for row in rows.values() if row.get("ModifiedDate") is not None]
+    return NameIndex(rows, max(modified) if modified else None)
+
+
+class CustomerIndex(BackgroundRefresh[NameIndex]):
+    """Holds the current NameIndex of one database and refreshes it in the background."""
+
+    thread_name = "customer-index-refresh"
+
+    def __init__(self, sql_query_prep: dict, conn_string: str, refresh_seconds: float = CUSTOMER_INDEX_REFRESH_SECONDS,
+                 max_age_seconds: float = CUSTOMER_INDEX_MAX_AGE_SECONDS):
+        super().__init__(sql_query_prep, conn_string, refresh_seconds)
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._metrics.update({"loads": 0, "incremental_refreshes": 0, "rows_merged": 0, "last_load_seconds": None,
+                              "exact_matches": 0, "initial_matches": 0, "fuzzy_matches": 0,
+                              "ambiguous_matches": 0, "none_matches": 0})
+
+    def load(self) -> NameIndex:
+        start = time.perf_counter()
+        rows = {row["CustomerID"]: row for row in self._query('query_customer_index')}
+        index = _build(rows)
+        self._metrics["loads"] += 1
+        self._metrics["last_load_seconds"] = time.perf_counter() - start
+        return index
+
+    def _merge_changes(self, index: NameIndex) -> NameIndex:
+        since = _EPOCH + datetime.timedelta(milliseconds=index.modified_through)
+        # >= so rows sharing the last timestamp are not missed; merging a row twice is harmless.
+        changed = self._query('query_customer_changes', since)
+        self._metrics["incremental_refreshes"] += 1
+        fresh = [row for row in changed if index.rows.get(row["CustomerID"]) != row]
+        if not fresh:
+            return index
+        rows = dict(index.rows)
+        rows.update((row["CustomerID"], row) for row in fresh)
+        merged = _build(rows)
+        # Keep the age of the full load, so deletions are still picked up on time.
+        merged.loaded_at = index.loaded_at
+        self._metrics["rows_merged"] += len(fresh)
+        return merged
+
+    def refresh(self, index: NameIndex) -> NameIndex:
+        if time.time() - index.loaded_at >= self.max_age_seconds or index.modified_through is None:
+            return self.load()
+        return self._merge_changes(index)
+
+    def _lookup(self, index: NameIndex, customer: str) -> list:
+        kind, customer_ids = index.match(customer)
+        with self._lock:
+            self._metrics[f"{kind}_matches"] += 1
+        return [index.rows[customer_id] for customer_id in customer_ids]
+
+    def lookup(self, customer: str) -> list:
+        """The customer rows matching the name."""
+        return self._lookup(self.current(), customer)
+
+    async def lookup_async(self, customer: str) -> list:
+        return self._lookup(await self.current_async(), customer)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._metrics)
+        index = self._value
+        stats["customers"] = len(index) if index is not None else 0
+        stats["age_seconds"] = time.time() - index.loaded_at if index is not None else None
+        return stats
+
+
+_indexes = PerDatabase(CustomerIndex)
+
+
+def get_customer_index(sql_query_prep: dict, conn_string: str) -> CustomerIndex:
+    return _indexes.get(sql_query_prep, conn_string)
@@ -0,0 +1,171 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Per-request deadline shared by all SQL, embedding and search calls of a flow run.
+
+The request_deadline node turns the request budget into an absolute deadline
+that every node receives as its `deadline` input and enters with
+deadline_scope. Inside the scope the data access code caps each call at the
+time remaining: the SQL query timeout, the wait for a pooled connection and the
+HTTP timeouts. One slow dependency then fails its call instead of holding the
+whole request.
+
+Idempotent async calls can also be hedged: when the first attempt is still
+running after the p95 latency recently seen for that kind of call, a second
+one is sent and whichever answers first is used.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional
+
+# Default budget of a whole flow run, from the first node to the last.
+REQUEST_DEADLINE_SECONDS = 20.0
+# Latencies remembered per kind of call for the hedging delay.
+HEDGE_WINDOW = 256
+# No hedging before this many latencies of a kind were seen.
+HEDGE_MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 95
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call would start, or is still running, after the request deadline."""
+
+
+# {"deadline": epoch seconds, "hedge": bool} of the current request, None outside a scope.
+_request = contextvars.ContextVar("request_deadline", default=None)
+
+
+def new_deadline(budget_seconds: float = REQUEST_DEADLINE_SECONDS, hedge: bool = False) -> dict:
+    # Wall clock rather than monotonic time, because nodes may run in other processes.
+    return {"deadline": time.time() + budget_seconds, "hedge": hedge}
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[dict]):
+    """Apply a deadline from new_deadline to the calls made inside; None means no deadline."""
+    token = _request.set(deadline)
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the deadline, None without one; raises DeadlineExceeded once it passed."""
+    request = _request.get()
+    if not request:
+        return None
+    left = request["deadline"] - time.time()
+    if left <= 0:
+        _tracker.count("deadline_exceeded")
+        raise DeadlineExceeded("request deadline exceeded")
+    return left
+
+
+def cap(seconds: Optional[float]) -> Optional[float]:
+    """A timeout of at most seconds that also ends at the deadline; None if neither applies."""
+    left = remaining()
+    if left is None:
+        return seconds
+    return left if seconds is None else min(seconds, left)
+
+
+def hedging_enabled() -> bool:
+    request = _request.get()
+    return bool(request and request.get("hedge"))
+
+
+class LatencyTracker:
+    """Recent latencies per kind of call, and counters of hedges and missed deadlines."""
+
+    def __init__(self, window: int = HEDGE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._metrics = {"calls": 0, "hedged": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+
+    def count(self, metric: str):
+        with self._lock:
+            self._metrics[metric] += 1
+
+    def record(self, kind: str, seconds: float):
+        with self._lock:
+            self._metrics["calls"] += 1
+            latencies = self._latencies.get(kind)
+            if latencies is None:
+                latencies = self._latencies[kind] = deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def percentile(self, kind: str, percentile: float) -> Optional[float]:
+        with self._lock:
+            latencies = sorted(self._latencies.get(kind, ()))
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        with self._lock:
+            samples = len(self._latencies.get(kind, ()))
+        if samples < HEDGE_MIN_SAMPLES:
+            return None
+        return self.percentile(kind, HEDGE_PERCENTILE)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._metrics)
+            kinds = list(self._latencies)
+        for kind in kinds:
+            for percentile in (50, 95, 99):
+                stats[f"{kind}_p{percentile}_seconds"] = self.percentile(kind, percentile)
+        return stats
+
+
+_tracker = LatencyTracker()
+
+
+def stats() -> dict:
+    return _tracker.stats()
+
+
+async def call_async(kind: str, call: Callable[[], Awaitable]):
+    """
+    Await call() within the deadline, recording its latency under kind.
+
+    With hedging on for the request, call must be idempotent: it is called a
+    second time if the first attempt has not finished after the hedging delay.
+    """
+    start = time.perf_counter()
+    first = asyncio.ensure_future(call())
+    attempts = [first]
+    try:
+        delay = _tracker.hedge_delay(kind) if hedging_enabled() else None
+        if delay is not None and cap(delay) == delay:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                _tracker.count("hedged")
+                attempts.append(asyncio.ensure_future(call()))
+        while True:
+            done, _ = await asyncio.wait(attempts, timeout=cap(None), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                _tracker.count("deadline_exceeded")
+                raise DeadlineExceeded(f"{kind} call still running at the request deadline")
+            winner = done.pop()
+            if winner.exception() is None:
+                break
+            attempts.remove(winner)
+            if not attempts:
+                return winner.result()
+            # One attempt failed; keep waiting for the other one.
+        if winner is not first:
+            _tracker.count("hedge_wins")
+        _tracker.record(kind, time.perf_counter() - start)
+        return winner.result()
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
@@ -0,0 +1,131 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Two-tier cache for question embeddings.
+
+Chat traffic repeats a small set of questions, and every embedding call is an
+HTTP round trip to Azure OpenAI. Vectors are cached by (deployment, api version,
+normalized text): first in a size-bounded in-process LRU, then in a SQLite file
+that survives worker restarts and is shared by the workers on a machine.
+"""
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+# Vectors kept in process memory; an ada-002 vector is ~6 KB as float32.
+MEMORY_MAX_ENTRIES = 2048
+# Rows kept in the SQLite store before the oldest are pruned.
+DISK_MAX_ENTRIES = 100_000
+# Set EMBEDDING_CACHE_PATH to an empty string to keep the cache in memory only.
+EMBEDDING_CACHE_PATH = os.environ.get(
+    "EMBEDDING_CACHE_PATH", os.path.join(tempfile.gettempdir(), "promptflow-demo-embeddings.sqlite"))
+
+
+def normalize_text(text: str) -> str:
+    """Questions differing only in case, Unicode form or whitespace share an embedding."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def cache_key(deployment: str, api_version: str, text: str) -> str:
+    raw = "\x1f".join((deployment, api_version, normalize_text(text)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: Optional[str] = EMBEDDING_CACHE_PATH,
+                 memory_max_entries: int = MEMORY_MAX_ENTRIES, disk_max_entries: int = DISK_MAX_ENTRIES):
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_entries = disk_max_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._metrics = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "memory_evictions": 0}
+        self._db = None
+        self._disk_writes = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)")
+
+    def _remember_locked(self, key: str, vector: array):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+            self._metrics["memory_evictions"] += 1
+
+    def get(self, deployment: str, api_version: str, text: str) -> Optional[list]:
+        key = cache_key(deployment, api_version, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._metrics["memory_hits"] += 1
+                return vector.tolist()
+            row = None
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._metrics["misses"] += 1
+                return None
+            vector = array("f")
+            vector.frombytes(row[0])
+            self._remember_locked(key, vector)
+            self._metrics["disk_hits"] += 1
+            return vector.tolist()
+
+    def put(self, deployment: str, api_version: str, text: str, embedding: list):
+        key = cache_key(deployment, api_version, text)
+        vector = array("f", embedding)
+        with self._lock:
+            self._remember_locked(key, vector)
+            if self._db is None:
+                return
+            self._db.execute("INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                             (key, vector.tobytes(), time.time()))
+            self._disk_writes += 1
+            # Pruning needs a COUNT(*), so only do it every few hundred writes.
+            if self._disk_writes % 256 == 0:
+                self._prune_disk_locked()
+
+    def _prune_disk_locked(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.disk_max_entries:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY created_at LIMIT ?)", (count - self.disk_max_entries,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._metrics)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """The process-wide cache; falls back to memory only if the SQLite file cannot be opened."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = EmbeddingCache()
+                except sqlite3.Error:
+                    _cache = EmbeddingCache(path=None)
+    return _cache
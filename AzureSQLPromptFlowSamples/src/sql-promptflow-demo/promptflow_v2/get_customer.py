@@ -4,35 +4,47 @@
 from promptflow import tool
 from promptflow.connections import CustomConnection
 
-import pyodbc
-import pandas as pd
-import numpy as np
-import sqlalchemy as sa
-import json
-
-def execute_sql(sql_query: str, conn_db: CustomConnection):
-
-    conn_string = conn_db['connection-string']
-    with pyodbc.connect(conn_string,autocommit=True) as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(sql_query)
-            query_out = cursor.fetchall()
-
-    toReturn = pd.DataFrame((tuple(t) for t in query_out)) 
-    toReturn.columns = [column[0] for column in cursor.description]
-
-    return toReturn
+from customer_batch import batch_customer
+from customer_cache import customer_key, get_customer_cache
+from customer_index import get_customer_index
+from deadline import deadline_scope
+from read_routing import connection_string
+from sql_query_store import run_query_async
 
 
 @tool
-def get_customer(customer: str, conn_db: CustomConnection):
-    first_name = customer.split()[0]
-    last_name = customer.split()[-1]
-    customer_query = f"""select * from [SalesLT].[Customer] 
-                         WHERE FirstName='{first_name}' AND LastName='{last_name}'"""
-
-    out_df = execute_sql(sql_query=customer_query, conn_db=conn_db)
-    out_json = out_df.to_json(orient="records")
-    out_dict = json.loads(out_json)
-
-    return out_dict
\ No newline at end of file
+async def get_customer(customer: str, sql_query_prep: dict, conn_db: CustomConnection, deadline: dict = None,
+                       batch_customers: list = None):
+    """
+    Customer rows for a "First [Middle] Last" name.
+
+    The in-memory customer index resolves the name, also by initial ("A. Leonetti")
+    or with a typo; the first call of a worker waits for it to load. Only when the
+    index cannot be loaded does the name fall back to SQL, matching first and last
+    name exactly: in a batch run through batch_customer, which resolves the
+    customers of all lines with one query, otherwise through the per-conversation
+    customer cache.
+    """
+    with deadline_scope(deadline):
+        if not customer.split():
+            return []
+        first_name = customer.split()[0]
+        last_name = customer.split()[-1]
+        conn_string = connection_string(conn_db)
+
+        try:
+            return await get_customer_index(sql_query_prep, conn_string).lookup_async(customer)
+        except Exception:
+            pass
+
+        # The index could not be loaded: in a batch run, the customers of all lines are resolved together.
+        out_dict = await batch_customer(sql_query_prep, conn_string, batch_customers, customer)
+        if out_dict is not None:
+            return out_dict
+
+        # The customer does not change within a conversation; later turns are served from the cache.
+        out_dict = await get_customer_cache().get_or_load(
+            customer_key(conn_string, first_name, last_name),
+            lambda: run_query_async(sql_query_prep, 'query_customer', conn_string, first_name, last_name))
+
+        return out_dict
@@ -4,39 +4,38 @@
 from promptflow import tool
 from promptflow.connections import CustomConnection
 
-import pyodbc
-import pandas as pd
-import numpy as np
-import sqlalchemy as sa
-import json
-
-
-def execute_sql(sql_query: str, conn_db: CustomConnection):
-
-    conn_string = conn_db['connection-string']
-    with pyodbc.connect(conn_string,autocommit=True) as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(sql_query)
-            query_out = cursor.fetchall()
-
-    toReturn = pd.DataFrame((tuple(t) for t in query_out)) 
-    toReturn.columns = [column[0] for column in cursor.description]
-
-    return toReturn
+from columnar import to_payload
+from customer_batch import batch_orders
+from deadline import deadline_scope
+from read_routing import connection_string
+from sql_query_store import run_query_async
 
 
 @tool
-def get_orders(customer: list, sql_query_prep: dict, conn_db:CustomConnection):
-
-    list_cust_id = list(map(lambda x: x['CustomerID'], customer))
-    list_cust_id = str(tuple(list_cust_id)).replace(",)", ")")
-    order_query = sql_query_prep['query_order'].replace("{list_cust}", list_cust_id)
-
-    try:
-        out_df = execute_sql(sql_query=order_query, conn_db=conn_db)
-        out_json = out_df.to_json(orient="records")
-        out_dict = json.loads(out_json)
-    except:
-        out_dict = {}
-
-    return out_dict
\ No newline at end of file
+async def get_orders(customer: list, sql_query_prep: dict, conn_db:CustomConnection,
+                     order_history: str = "lines", max_rows: int = 50, payload_format: str = "records",
+                     deadline: dict = None, batch_customers: list = None):
+    """
+    order_history "lines" returns every order line; "summary" returns one row per product
+    with OrderQty, OrderCount and LastOrderDate, most recent first and at most max_rows rows.
+    """
+
+    with deadline_scope(deadline):
+        list_cust_id = list(map(lambda x: x['CustomerID'], customer))
+        if not list_cust_id:
+            return []
+
+        try:
+            # In a batch run, the orders of all customers are read together with the first line.
+            out_dict = await batch_orders(sql_query_prep, connection_string(conn_db), batch_customers, list_cust_id,
+                                          order_history, max_rows)
+            if out_dict is None and order_history == "summary":
+                out_dict = await run_query_async(sql_query_prep, 'query_order_summary', connection_string(conn_db),
+                                                 max_rows, list_cust_id, max_rows=max_rows)
+            elif out_dict is None:
+                out_dict = await run_query_async(sql_query_prep, 'query_order', connection_string(conn_db),
+                                                 list_cust_id)
+        except:
+            out_dict = {}
+
+        return to_payload(out_dict, payload_format)
@@ -3,79 +3,47 @@
 
 from promptflow import tool
 from promptflow.connections import CustomConnection
-from azure.core.credentials import AzureKeyCredential
-import requests
-import json
-import os
-import openai
-import re
-import pyodbc
-import pandas as pd
-import numpy as np
-import sqlalchemy as sa
 
+from catalog_snapshot import get_catalog
+from columnar import to_payload
+from deadline import deadline_scope
+from read_routing import connection_string
+from retriever import get_retriever
+from sales_prefetch import put_sales_stats
+from search_client import generate_embeddings_async
+from sql_query_store import run_query_async, run_query_batch_async
 
-def generate_embeddings(text, conn: CustomConnection):
-    openai.api_base = conn.OPENAI_API_BASE_EMBED
-    openai.api_key = conn.OPENAI_API_KEY_EMBED
-    openai.api_version = conn.OPENAI_API_VERSION
-    openai.api_type = "azure"
-
-    response = openai.Embedding.create(
-        input=text, engine="text-embedding-ada-002")
-    embeddings = response['data'][0]['embedding']
-    return embeddings
-
-def execute_sql(sql_query: str, conn_db: CustomConnection):
-
-    conn_string = conn_db['connection-string']
-    with pyodbc.connect(conn_string,autocommit=True) as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(sql_query)
-            query_out = cursor.fetchall()
-
-    toReturn = pd.DataFrame((tuple(t) for t in query_out)) 
-    toReturn.columns = [column[0] for column in cursor.description]
-
-    return toReturn
 
 @tool
-def get_product(search_text: str, sql_query_prep: dict, conn: CustomConnection, conn_db: CustomConnection, top_k:int) -> str:
-    search_service = "sqldricopilot"
-    index_name =  "promptflow-demo-product-description"
-    search_key = conn["acs-search-key"]
-    api_version = "2023-07-01-Preview"
-
-    headers = {
-            'Content-Type': 'application/json',
-            'api-key': search_key,
-        }
-    params = {
-        'api-version': api_version,
-    }
-    body = {
-        "vector": {
-            "value": generate_embeddings(text = search_text, conn = conn),
-            "fields": "DescriptionVector, ProductCategoryNameVector",
-            "k": top_k
-        },
-        "search": search_text,
-        "select": "ProductId, ProductCategoryName, Name, ProductNumber, Color, ListPrice, Size, ProductCategoryID, ProductModelID, ProductDescriptionID, Description",
-        "top": top_k,
-    }
-    response = requests.post(
-        f"https://{search_service}.search.windows.net/indexes/{index_name}/docs/search", headers=headers, params=params, json=body)
-    response_json = response.json()['value']
-
-    list_prod_id = list(map(lambda x: x['ProductId'], response_json))
-    list_prod_id = str(tuple(list_prod_id)).replace(",)", ")")
-    query_product = sql_query_prep['query_prod_byID'].replace("{list_product}", list_prod_id)
-
-    try:
-        out_df = execute_sql(sql_query=query_product, conn_db=conn_db)
-        out_json = out_df.to_json(orient="records")
-        out_dict = json.loads(out_json)
-    except:
-        out_dict = {}
-
-    return out_dict
\ No newline at end of file
+async def get_product(search_text: str, sql_query_prep: dict, conn: CustomConnection, conn_db: CustomConnection, top_k:int,
+                      retriever: str = "acs", local_index_path: str = "", product_source: str = "snapshot",
+                      payload_format: str = "records", deadline: dict = None) -> str:
+    with deadline_scope(deadline):
+        product_retriever = get_retriever(retriever, conn=conn, local_index_path=local_index_path)
+
+        vector = await generate_embeddings_async(text=search_text, conn=conn)
+        list_prod_id = await product_retriever.search_async(search_text, vector, top_k)
+        if not list_prod_id:
+            return []
+
+        conn_string = connection_string(conn_db)
+        try:
+            if product_source == "sql":
+                # Product details and the top sellers of their categories in one round trip;
+                # get_sales_stat picks the sales stats up instead of querying again.
+                out_dict, sales_stats = await run_query_batch_async(sql_query_prep, 'query_prod_and_sales', conn_string,
+                                                                    list_prod_id, list_prod_id)
+                put_sales_stats(conn_string, [p['ProductCategoryID'] for p in out_dict], sales_stats)
+            else:
+                catalog = await get_catalog(sql_query_prep, conn_string).snapshot_async()
+                out_dict, missing_ids = catalog.lookup(list_prod_id)
+                if missing_ids:
+                    # Products added after the snapshot was taken; without them the snapshot hits still answer.
+                    try:
+                        out_dict += await run_query_async(sql_query_prep, 'query_prod_byID', conn_string, missing_ids)
+                    except Exception:
+                        pass
+        except:
+            out_dict = {}
+
+        return to_payload(out_dict, payload_format)
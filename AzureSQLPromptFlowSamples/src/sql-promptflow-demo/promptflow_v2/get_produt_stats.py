@@ -3,42 +3,34 @@
 
 from promptflow import tool
 from promptflow.connections import CustomConnection
-from azure.core.credentials import AzureKeyCredential
-import requests
-import json
-import os
-import openai
-import re
-import pyodbc
-import pandas as pd
-import numpy as np
-import sqlalchemy as sa
+from columnar import to_payload, to_records
+from deadline import deadline_scope
+from read_routing import connection_string
+from sales_leaderboard import get_leaderboard
+from sales_prefetch import take_sales_stats
+from sql_query_store import run_query_async
 
-def execute_sql(sql_query: str, conn_db: CustomConnection):
-
-    conn_string = conn_db['connection-string']
-    with pyodbc.connect(conn_string,autocommit=True) as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(sql_query)
-            query_out = cursor.fetchall()
-
-    toReturn = pd.DataFrame((tuple(t) for t in query_out)) 
-    toReturn.columns = [column[0] for column in cursor.description]
-
-    return toReturn
 
 @tool
-def get_sales_stat(products: list, sql_query_prep: dict, conn_db: CustomConnection):
-
-  list_cate_id = list(map(lambda x: x['ProductCategoryID'], products))
-  list_cate_id = str(tuple(list_cate_id)).replace(",)", ")")
-  query_sales_stat = sql_query_prep['query_sales_stat'].replace("{list_cate}", list_cate_id)
-
-  try:
-      out_df = execute_sql(sql_query=query_sales_stat, conn_db=conn_db)
-      out_json = out_df.to_json(orient="records")
-      out_dict = json.loads(out_json)
-  except:
-      out_dict = {}
-
-  return out_dict
\ No newline at end of file
+async def get_sales_stat(products: object, sql_query_prep: dict, conn_db: CustomConnection, payload_format: str = "records",
+                         deadline: dict = None):
+
+  with deadline_scope(deadline):
+    list_cate_id = list(map(lambda x: x['ProductCategoryID'], to_records(products)))
+    if not list_cate_id:
+        return []
+
+    prefetched = take_sales_stats(connection_string(conn_db), list_cate_id)
+    if prefetched is not None:
+        return to_payload(prefetched, payload_format)
+
+    try:
+        # Top sellers change slowly; they are precomputed for all categories in the background.
+        out_dict = await get_leaderboard(sql_query_prep, connection_string(conn_db)).top_async(list_cate_id)
+    except:
+        try:
+            out_dict = await run_query_async(sql_query_prep, 'query_sales_stat', connection_string(conn_db), list_cate_id)
+        except:
+            out_dict = {}
+
+    return to_payload(out_dict, payload_format)
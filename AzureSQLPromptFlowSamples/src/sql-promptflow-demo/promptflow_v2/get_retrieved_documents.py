@@ -3,14 +3,19 @@
 
 from promptflow import tool
 
+from context_assembler import CONTEXT_LAYOUT, CONTEXT_TOKEN_BUDGET, assemble_context
+
 # The inputs section will change based on the arguments of the tool function, after you save the code
 # Adding type to arguments and return value will help the system show the types properly
 # Please update the function name/signature per need
 @tool
-def my_python_tool(input1: list, input2: list, input3: list) -> str:
-  retrieved_documents = {
-                          "User past orders": input1,
-                          "Retrieved relevant products": input2,
-                          "Retrieved product sales stats": input3,
-                        }
-  return retrieved_documents
\ No newline at end of file
+def my_python_tool(input1: object, input2: object, input3: object, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                   layout: str = CONTEXT_LAYOUT) -> dict:
+  # Inputs are lists of records or columnar payloads.
+  # Returns {"context": compact text for the chat prompt, "tokens": what packing saved}
+  retrieved_documents = assemble_context([
+                          ("Products", input2),
+                          ("Previous purchases", input1),
+                          ("Product sales summary", input3),
+                        ], token_budget, layout=layout)
+  return retrieved_documents
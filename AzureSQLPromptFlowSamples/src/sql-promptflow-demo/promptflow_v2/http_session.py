@@ -0,0 +1,86 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Shared keep-alive HTTP clients for the Azure OpenAI and Azure Cognitive Search calls.
+
+Creating a client per request pays a TCP + TLS handshake every time. The client
+here is created once per process and keeps its connections open between tool
+calls. promptflow runs every async line in a loop of its own, so an async client
+would be bound to one line; post_async instead runs the process-wide client on
+a bounded thread pool, and async tools reuse its connections too. HTTP/2 is used
+when the h2 package is installed.
+"""
+
+import asyncio
+import contextvars
+import functools
+import importlib.util
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from deadline import cap
+
+# Connection pool and timeout settings; change them with configure() before first use.
+HTTP_SETTINGS = {
+    "max_connections": 32,
+    "max_keepalive_connections": 16,
+    "keepalive_expiry": 120.0,
+    "connect_timeout": 5.0,
+    "read_timeout": 30.0,
+    "http2": importlib.util.find_spec("h2") is not None,
+}
+
+_lock = threading.Lock()
+_client = None
+# Runs the blocking client for the async tools; one thread per pooled connection.
+_http_threads = ThreadPoolExecutor(max_workers=HTTP_SETTINGS["max_connections"], thread_name_prefix="http")
+
+
+def configure(**settings):
+    """Override HTTP_SETTINGS; clients that already exist are closed and recreated lazily."""
+    global _client
+    unknown = set(settings) - set(HTTP_SETTINGS)
+    if unknown:
+        raise ValueError(f"unknown HTTP settings: {sorted(unknown)}")
+    with _lock:
+        HTTP_SETTINGS.update(settings)
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _client_kwargs() -> dict:
+    return {
+        "limits": httpx.Limits(max_connections=HTTP_SETTINGS["max_connections"],
+                               max_keepalive_connections=HTTP_SETTINGS["max_keepalive_connections"],
+                               keepalive_expiry=HTTP_SETTINGS["keepalive_expiry"]),
+        "timeout": httpx.Timeout(HTTP_SETTINGS["read_timeout"], connect=HTTP_SETTINGS["connect_timeout"]),
+        "http2": HTTP_SETTINGS["http2"],
+    }
+
+
+def request_timeout() -> httpx.Timeout:
+    """The configured timeouts, shortened to end at the request deadline of the caller."""
+    return httpx.Timeout(cap(HTTP_SETTINGS["read_timeout"]), connect=cap(HTTP_SETTINGS["connect_timeout"]))
+
+
+def get_client() -> httpx.Client:
+    """The process-wide blocking client; it is thread-safe."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(**_client_kwargs())
+    return _client
+
+
+async def post_async(url: str, **kwargs) -> httpx.Response:
+    """get_client().post for async tools, on a worker thread; the timeout defaults to request_timeout()."""
+    loop = asyncio.get_running_loop()
+    # The worker thread runs in a copy of the caller's context, so it sees the request deadline.
+    kwargs.setdefault("timeout", request_timeout())
+    return await loop.run_in_executor(
+        _http_threads, functools.partial(contextvars.copy_context().run, get_client().post, url, **kwargs))
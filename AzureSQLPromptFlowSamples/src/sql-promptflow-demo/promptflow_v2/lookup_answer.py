@@ -0,0 +1,29 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+from promptflow import tool
+from promptflow.connections import CustomConnection
+
+from answer_cache import get_answer_cache, prompt_hash
+from deadline import deadline_scope
+from search_client import generate_embeddings_async
+
+
+@tool
+async def lookup_answer(question: str, chat_history: list, customer: object, retrieved_context: str,
+                        conn: CustomConnection, answer_cache_enabled: bool = True, deadline: dict = None) -> dict:
+    with deadline_scope(deadline):
+        # The chat node only runs when this is not a hit; store_answer returns whichever answer there is.
+        if not answer_cache_enabled:
+            return {"enabled": False, "hit": False, "answer": None, "prompt": None, "similarity": None}
+
+        prompt = prompt_hash(retrieved_context, chat_history, customer)
+        try:
+            # get_product embedded the same question, so this is served from the embedding cache.
+            vector = await generate_embeddings_async(text=question, conn=conn)
+            answer, similarity = get_answer_cache().get(prompt, vector)
+        except:
+            answer, similarity = None, None
+
+        return {"enabled": True, "hit": answer is not None, "answer": answer, "prompt": prompt,
+                "similarity": similarity}
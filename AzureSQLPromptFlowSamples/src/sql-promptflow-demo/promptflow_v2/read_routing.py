@@ -0,0 +1,203 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Routing of the read-only retrieval queries to readable replicas.
+
+Every query of the chat flow is a SELECT, yet all of them went to the primary.
+The servers listed in the "read-replica-servers" config of the SQL connection are
+reached with ApplicationIntent=ReadOnly, which on Azure SQL lands on a readable
+secondary (a geo replica, or the HA replica of the primary's own server). The
+queries in READ_ONLY_QUERIES rotate over the healthy replicas; a replica that
+fails to connect, or lags more than "read-max-staleness-seconds" behind, is left
+out for REPLICA_RETRY_SECONDS and the query fails over to the next one, and
+finally to the primary.
+"""
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import re
+import threading
+import time
+from typing import Callable, List, Optional
+
+import pyodbc
+
+from sql_executor import PoolTimeoutError, _is_connection_error, execute_sql
+
+# Registry names of the statements that may be served by a replica.
+READ_ONLY_QUERIES = frozenset({"query_customer", "query_customer_index", "query_customer_changes", "query_order",
+                               "query_order_summary", "query_prod_byID", "query_prod_catalog", "query_change_version",
+                               "query_sales_stat", "query_prod_and_sales", "query_sales_leaderboard",
+                               "query_customers_by_name", "query_customer_orders_by_name",
+                               "query_customer_order_summary_by_name"})
+# How long a failed or lagging replica is skipped before it is tried again.
+REPLICA_RETRY_SECONDS = 30
+# How often the replication lag of a replica is measured when a max staleness is set.
+STALENESS_CHECK_SECONDS = 10
+
+# Seconds since the last transaction was redone on a secondary; NULL on a primary.
+STALENESS_QUERY = """SELECT DATEDIFF(second, MAX(last_commit_time), SYSUTCDATETIME()) AS lag_seconds
+                     FROM sys.dm_database_replica_states WHERE is_local = 1"""
+
+
+def _setting(conn_db, key: str) -> Optional[str]:
+    try:
+        return conn_db[key]
+    except (KeyError, AttributeError):
+        return None
+
+
+def replica_connection_string(primary: str, server: str = "") -> str:
+    """The primary's connection string with ApplicationIntent=ReadOnly, on server if one is given."""
+    parts = [part for part in primary.split(";")
+             if part.strip() and not re.match(r"\s*applicationintent\s*=", part, re.IGNORECASE)]
+    if server:
+        parts = [part for part in parts if not re.match(r"\s*(server|address|addr)\s*=", part, re.IGNORECASE)]
+        parts.insert(0, f"Server={server}")
+    return ";".join(parts + ["ApplicationIntent=ReadOnly"]) + ";"
+
+
+class _Replica:
+    def __init__(self, conn_string: str):
+        self.conn_string = conn_string
+        self.down_until = 0.0
+        self.checked_at = 0.0
+        self.lag_seconds = None
+
+
+class ReadRouter:
+    """Picks the endpoint of each read-only query for one primary database."""
+
+    def __init__(self, primary: str, replicas: List[str], max_staleness_seconds: Optional[float] = None,
+                 execute: Callable[..., list] = execute_sql):
+        self.primary = primary
+        self.max_staleness_seconds = max_staleness_seconds
+        self._execute = execute
+        self._replicas = [_Replica(conn_string) for conn_string in replicas]
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._metrics = {"replica_reads": 0, "primary_reads": 0, "failovers": 0, "stale_skips": 0}
+
+    def _count(self, metric: str):
+        with self._lock:
+            self._metrics[metric] += 1
+
+    def _is_fresh(self, replica: _Replica) -> bool:
+        if self.max_staleness_seconds is None:
+            return True
+        now = time.monotonic()
+        if now - replica.checked_at >= STALENESS_CHECK_SECONDS:
+            replica.checked_at = now
+            replica.lag_seconds = self._execute(STALENESS_QUERY, replica.conn_string)[0]["lag_seconds"]
+        return replica.lag_seconds is None or replica.lag_seconds <= self.max_staleness_seconds
+
+    def _candidates(self) -> List[_Replica]:
+        now = time.monotonic()
+        start = next(self._next)
+        count = len(self._replicas)
+        rotated = [self._replicas[(start + i) % count] for i in range(count)]
+        return [replica for replica in rotated if replica.down_until <= now]
+
+    def _usable(self, replica: _Replica) -> bool:
+        try:
+            if self._is_fresh(replica):
+                return True
+            self._count("stale_skips")
+        except (pyodbc.Error, PoolTimeoutError):
+            self._count("failovers")
+        replica.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        return False
+
+    def _failed(self, replica: _Replica, error: Exception) -> bool:
+        # Only connection problems fail over; a bad query would fail on the primary too, and
+        # a query timeout means a slow query or a spent deadline rather than a faulty replica.
+        if isinstance(error, PoolTimeoutError) or (isinstance(error, pyodbc.Error) and _is_connection_error(error)):
+            replica.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+            self._count("failovers")
+            return True
+        return False
+
+    def execute(self, run: Callable[..., list], *args, **kwargs):
+        """run(conn_string, *args, **kwargs) on a replica, or on the primary when none is usable."""
+        for replica in self._candidates():
+            if not self._usable(replica):
+                continue
+            try:
+                result = run(replica.conn_string, *args, **kwargs)
+            except Exception as error:
+                if self._failed(replica, error):
+                    continue
+                raise
+            self._count("replica_reads")
+            return result
+        self._count("primary_reads")
+        return run(self.primary, *args, **kwargs)
+
+    async def execute_async(self, run, *args, **kwargs):
+        """execute for coroutine functions; the staleness check runs on the default executor."""
+        loop = asyncio.get_running_loop()
+        for replica in self._candidates():
+            # The staleness query runs under the caller's deadline.
+            usable = functools.partial(contextvars.copy_context().run, self._usable, replica)
+            if not await loop.run_in_executor(None, usable):
+                continue
+            try:
+                result = await run(replica.conn_string, *args, **kwargs)
+            except Exception as error:
+                if self._failed(replica, error):
+                    continue
+                raise
+            self._count("replica_reads")
+            return result
+        self._count("primary_reads")
+        return await run(self.primary, *args, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._metrics)
+        now = time.monotonic()
+        stats["replicas"] = len(self._replicas)
+        stats["replicas_down"] = sum(replica.down_until > now for replica in self._replicas)
+        stats["replica_lag_seconds"] = [replica.lag_seconds for replica in self._replicas]
+        return stats
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_read_router(primary: str) -> ReadRouter:
+    """The router of a primary; without configure_replicas it sends everything to the primary."""
+    router = _routers.get(primary)
+    if router is None:
+        with _routers_lock:
+            router = _routers.get(primary)
+            if router is None:
+                router = _routers[primary] = ReadRouter(primary, [])
+    return router
+
+
+def configure_replicas(primary: str, servers: List[str], max_staleness_seconds: Optional[float] = None):
+    """Route the read-only queries of primary to servers; "" stands for the primary's own readable secondary."""
+    router = ReadRouter(primary, [replica_connection_string(primary, server) for server in servers],
+                        max_staleness_seconds)
+    with _routers_lock:
+        _routers[primary] = router
+    return router
+
+
+def connection_string(conn_db) -> str:
+    """The primary connection string of a SQL connection, registering its read replicas on first use."""
+    primary = conn_db['connection-string']
+    if primary not in _routers:
+        servers = _setting(conn_db, "read-replica-servers")
+        staleness = _setting(conn_db, "read-max-staleness-seconds")
+        if servers is None:
+            get_read_router(primary)
+        else:
+            configure_replicas(primary, [server.strip() for server in servers.split(",")],
+                               float(staleness) if staleness else None)
+    return primary
@@ -0,0 +1,13 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+from promptflow import tool
+
+from deadline import REQUEST_DEADLINE_SECONDS, new_deadline
+
+
+@tool
+def request_deadline(budget_seconds: float = REQUEST_DEADLINE_SECONDS, hedge: bool = False) -> dict:
+    # Passed to every node as its deadline input; SQL, embedding and search calls end at it.
+    # hedge resends slow ACS search and embedding calls after their recent p95 latency.
+    return new_deadline(budget_seconds, hedge)
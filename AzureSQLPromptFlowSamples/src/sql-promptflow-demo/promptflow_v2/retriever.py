@@ -0,0 +1,114 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Product retrievers used by get_product to turn a question into ProductIds.
+
+"acs" runs the hybrid search against Azure Cognitive Search. "local" searches an
+in-process copy of the product vectors: the catalog is a few thousand products,
+so an exact inner-product search over a memory-mapped matrix takes well under a
+millisecond and saves the network round trip. The backend is picked per deployment
+through the `retriever` input of the get_product node.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from search_client import search_products, search_products_async
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+VECTORS_FILE = "product_vectors.npy"
+IDS_FILE = "product_ids.npy"
+FAISS_FILE = "products.faiss"
+
+
+def _product_ids(hits: list) -> list:
+    return [int(hit['ProductId']) for hit in hits]
+
+
+class AcsRetriever:
+    def __init__(self, search_key: str):
+        self.search_key = search_key
+
+    def search(self, search_text: str, vector: list, top_k: int) -> list:
+        return _product_ids(search_products(search_text, self.search_key, vector, top_k))
+
+    async def search_async(self, search_text: str, vector: list, top_k: int) -> list:
+        return _product_ids(await search_products_async(search_text, self.search_key, vector, top_k))
+
+
+class LocalRetriever:
+    """
+    Exact inner-product search over the product vectors saved by save_local_index.
+
+    Each product is stored as DescriptionVector + ProductCategoryNameVector, so its
+    score is the sum of the similarities of both fields, like the two vector fields
+    ACS searches. A FAISS index is used instead of NumPy when one was saved and
+    faiss is installed.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.product_ids = np.load(os.path.join(directory, IDS_FILE))
+        self._index = None
+        self._vectors = None
+        faiss_path = os.path.join(directory, FAISS_FILE)
+        if faiss is not None and os.path.exists(faiss_path):
+            self._index = faiss.read_index(faiss_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        else:
+            self._vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode='r')
+
+    def search(self, search_text: str, vector: list, top_k: int) -> list:
+        query = np.asarray(vector, dtype=np.float32)
+        if self._index is not None:
+            _, ids = self._index.search(query.reshape(1, -1), top_k)
+            return [int(i) for i in ids[0] if i != -1]
+
+        scores = self._vectors @ query
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return self.product_ids[top].tolist()
+
+    async def search_async(self, search_text: str, vector: list, top_k: int) -> list:
+        # Sub-millisecond and CPU bound; handing it to a thread would cost more than it saves.
+        return self.search(search_text, vector, top_k)
+
+
+def save_local_index(directory: str, products: list):
+    """Write the files LocalRetriever loads from products carrying both ACS vector fields."""
+    os.makedirs(directory, exist_ok=True)
+    product_ids = np.array([int(p['ProductId']) for p in products], dtype=np.int64)
+    vectors = np.array([np.add(p['DescriptionVector'], p['ProductCategoryNameVector']) for p in products],
+                       dtype=np.float32)
+    np.save(os.path.join(directory, IDS_FILE), product_ids)
+    np.save(os.path.join(directory, VECTORS_FILE), vectors)
+    if faiss is not None:
+        index = faiss.IndexIDMap(faiss.IndexFlatIP(vectors.shape[1]))
+        index.add_with_ids(vectors, product_ids)
+        faiss.write_index(index, os.path.join(directory, FAISS_FILE))
+
+
+_local_retrievers = {}
+_local_retrievers_lock = threading.Lock()
+
+
+def get_retriever(name: str, conn=None, local_index_path: str = ""):
+    """The retriever configured for this deployment; local indexes are loaded once per worker."""
+    if name == "acs":
+        return AcsRetriever(conn["acs-search-key"])
+    if name == "local":
+        if not local_index_path:
+            raise ValueError("the local retriever needs local_index_path")
+        with _local_retrievers_lock:
+            retriever = _local_retrievers.get(local_index_path)
+            if retriever is None:
+                retriever = _local_retrievers[local_index_path] = LocalRetriever(local_index_path)
+        return retriever
+    raise ValueError(f"unknown retriever {name!r}, expected 'acs' or 'local'")
@@ -0,0 +1,69 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Precomputed top sellers of every product category for get_sales_stat.
+
+query_sales_stat groups the whole order history and ranks it per category on
+each chat turn, although it only needs five rows per category and those change
+slowly. The leaderboard of all categories is computed with one query per
+LEADERBOARD_REFRESH_SECONDS in the background, and get_sales_stat looks the
+requested categories up in memory. Requests never wait for a refresh, only for
+the very first load.
+"""
+
+import time
+from typing import Dict, List
+
+from background_refresh import BackgroundRefresh, PerDatabase
+
+LEADERBOARD_REFRESH_SECONDS = 300
+
+
+class SalesLeaderboard(BackgroundRefresh[Dict[int, List[dict]]]):
+    thread_name = "leaderboard-refresh"
+
+    def __init__(self, sql_query_prep: dict, conn_string: str, refresh_seconds: float = LEADERBOARD_REFRESH_SECONDS):
+        super().__init__(sql_query_prep, conn_string, refresh_seconds)
+        self._loaded_at = None
+        self._metrics.update({"refreshes": 0, "last_refresh_seconds": None})
+
+    def load(self) -> Dict[int, List[dict]]:
+        """ProductCategoryID -> rows of its top sellers, best first."""
+        start = time.perf_counter()
+        board = {}
+        for row in self._query('query_sales_leaderboard'):
+            board.setdefault(row.pop("ProductCategoryID"), []).append(row)
+        for rows in board.values():
+            rows.sort(key=lambda row: row["sales_count"], reverse=True)
+        self._loaded_at = time.time()
+        self._metrics["refreshes"] += 1
+        self._metrics["last_refresh_seconds"] = time.perf_counter() - start
+        return board
+
+    @staticmethod
+    def _top(board: Dict[int, List[dict]], category_ids: List[int]) -> List[dict]:
+        rows = []
+        for category_id in dict.fromkeys(category_ids):
+            rows.extend(board.get(category_id, ()))
+        return rows
+
+    def top(self, category_ids: List[int]) -> List[dict]:
+        """Top sellers of each requested category, with the columns of query_sales_stat."""
+        return self._top(self.current(), category_ids)
+
+    async def top_async(self, category_ids: List[int]) -> List[dict]:
+        return self._top(await self.current_async(), category_ids)
+
+    def stats(self) -> dict:
+        stats = dict(self._metrics)
+        stats["categories"] = len(self._value) if self._value is not None else 0
+        stats["age_seconds"] = time.time() - self._loaded_at if self._loaded_at else None
+        return stats
+
+
+_leaderboards = PerDatabase(SalesLeaderboard)
+
+
+def get_leaderboard(sql_query_prep: dict, conn_string: str) -> SalesLeaderboard:
+    return _leaderboards.get(sql_query_prep, conn_string)
@@ -0,0 +1,43 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Hand-off of sales stats fetched by get_product to get_sales_stat.
+
+With product_source "sql", get_product reads the product details and the top
+sellers of their categories in one batch. The second result set is parked here
+for a short time, keyed by database and category set, and get_sales_stat takes
+it instead of going back to SQL, so the node outputs stay as they were.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+# Sales stats not taken within this time (e.g. the run failed in between) are dropped.
+PREFETCH_TTL_SECONDS = 60
+PREFETCH_MAX_ENTRIES = 256
+
+_prefetched = OrderedDict()
+_prefetched_lock = threading.Lock()
+
+
+def _key(conn_string: str, category_ids: Iterable[int]) -> tuple:
+    return conn_string, frozenset(category_ids)
+
+
+def put_sales_stats(conn_string: str, category_ids: Iterable[int], rows: list):
+    with _prefetched_lock:
+        _prefetched[_key(conn_string, category_ids)] = (time.monotonic() + PREFETCH_TTL_SECONDS, rows)
+        while len(_prefetched) > PREFETCH_MAX_ENTRIES:
+            _prefetched.popitem(last=False)
+
+
+def take_sales_stats(conn_string: str, category_ids: Iterable[int]) -> Optional[list]:
+    """The parked sales stats for these categories, or None; each entry is handed out once."""
+    with _prefetched_lock:
+        entry = _prefetched.pop(_key(conn_string, category_ids), None)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return entry[1]
@@ -0,0 +1,99 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Embedding and Azure Cognitive Search calls shared by the product retrieval tools.
+
+Both calls come in a blocking flavour for the synchronous v1 tools and an async
+flavour, so that async tools can overlap them with SQL work on other branches.
+Both go through the shared keep-alive client in http_session, with timeouts
+that end at the request deadline; the async calls may be hedged (see deadline).
+"""
+
+from deadline import call_async
+from embedding_cache import get_embedding_cache
+from http_session import get_client, post_async, request_timeout
+
+SEARCH_SERVICE = "sqldricopilot"
+SEARCH_ENDPOINT = f"https://{SEARCH_SERVICE}.search.windows.net"
+INDEX_NAME = "promptflow-demo-product-description"
+SEARCH_API_VERSION = "2023-07-01-Preview"
+EMBEDDING_DEPLOYMENT = "text-embedding-ada-002"
+SEARCH_SELECT = ("ProductId, ProductCategoryName, Name, ProductNumber, Color, ListPrice, Size, "
+                 "ProductCategoryID, ProductModelID, ProductDescriptionID, Description")
+
+
+def _search_url() -> str:
+    return f"{SEARCH_ENDPOINT}/indexes/{INDEX_NAME}/docs/search"
+
+
+def _search_request(search_text: str, search_key: str, vector: list, top_k: int):
+    headers = {
+        'Content-Type': 'application/json',
+        'api-key': search_key,
+    }
+    params = {
+        'api-version': SEARCH_API_VERSION,
+    }
+    body = {
+        "vector": {
+            "value": vector,
+            "fields": "DescriptionVector, ProductCategoryNameVector",
+            "k": top_k
+        },
+        "search": search_text,
+        "select": SEARCH_SELECT,
+        "top": top_k,
+    }
+    return headers, params, body
+
+
+def _embedding_request(text: str, conn):
+    api_base = conn['OPENAI_API_BASE_EMBED'].rstrip('/')
+    url = f"{api_base}/openai/deployments/{EMBEDDING_DEPLOYMENT}/embeddings"
+    headers = {'api-key': conn['OPENAI_API_KEY_EMBED']}
+    params = {'api-version': conn['OPENAI_API_VERSION']}
+    return url, headers, params, {'input': text}
+
+
+def generate_embeddings(text: str, conn) -> list:
+    cache = get_embedding_cache()
+    cached = cache.get(EMBEDDING_DEPLOYMENT, conn['OPENAI_API_VERSION'], text)
+    if cached is not None:
+        return cached
+
+    url, headers, params, body = _embedding_request(text, conn)
+    response = get_client().post(url, headers=headers, params=params, json=body, timeout=request_timeout())
+    response.raise_for_status()
+    embedding = response.json()['data'][0]['embedding']
+    cache.put(EMBEDDING_DEPLOYMENT, conn['OPENAI_API_VERSION'], text, embedding)
+    return embedding
+
+
+async def generate_embeddings_async(text: str, conn) -> list:
+    cache = get_embedding_cache()
+    cached = cache.get(EMBEDDING_DEPLOYMENT, conn['OPENAI_API_VERSION'], text)
+    if cached is not None:
+        return cached
+
+    url, headers, params, body = _embedding_request(text, conn)
+    # Embedding a text is idempotent, so a slow call may be hedged.
+    response = await call_async("embedding", lambda: post_async(url, headers=headers, params=params, json=body))
+    response.raise_for_status()
+    embedding = response.json()['data'][0]['embedding']
+    cache.put(EMBEDDING_DEPLOYMENT, conn['OPENAI_API_VERSION'], text, embedding)
+    return embedding
+
+
+def search_products(search_text: str, search_key: str, vector: list, top_k: int) -> list:
+    """Hybrid (vector + keyword) product search; returns the ACS hits."""
+    headers, params, body = _search_request(search_text, search_key, vector, top_k)
+    response = get_client().post(_search_url(), headers=headers, params=params, json=body,
+                                 timeout=request_timeout())
+    return response.json()['value']
+
+
+async def search_products_async(search_text: str, search_key: str, vector: list, top_k: int) -> list:
+    headers, params, body = _search_request(search_text, search_key, vector, top_k)
+    response = await call_async("search", lambda: post_async(_search_url(), headers=headers, params=params, json=body))
+    return response.json()['value']
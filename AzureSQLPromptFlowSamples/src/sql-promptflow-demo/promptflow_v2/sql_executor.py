@@ -0,0 +1,384 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Shared SQL data access for the promptflow tools.
+
+Opening a pyodbc connection to Azure SQL costs a TCP + TLS + login handshake,
+so instead of connecting on every tool call we keep a bounded, thread-safe pool
+of connections per connection string for the lifetime of the worker process.
+"""
+
+import asyncio
+import contextvars
+import datetime
+import decimal
+import functools
+import itertools
+import json
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+
+import pyodbc
+
+from deadline import cap, remaining
+
+# Upper bound of open connections per connection string.
+POOL_MAX_SIZE = 8
+# Idle connections older than this are closed instead of being reused.
+POOL_MAX_IDLE_SECONDS = 300
+# Idle connections older than this are pinged before being handed out.
+POOL_HEALTH_CHECK_AFTER_SECONDS = 30
+# How long a caller waits for a free connection before giving up.
+POOL_ACQUIRE_TIMEOUT_SECONDS = 30
+# Rows pulled from the driver per fetchmany call while serializing a result set.
+FETCH_BATCH_SIZE = 500
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection became available in time."""
+
+
+class _PooledConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+def _is_connection_error(error: Exception) -> bool:
+    # SQLSTATE class 08 is "connection exception"; such connections are unusable. A query
+    # timeout (HYT00, HYT01) is an OperationalError as well but leaves the connection healthy.
+    if isinstance(error, pyodbc.InterfaceError):
+        return True
+    return bool(error.args) and str(error.args[0]).startswith("08")
+
+
+class ConnectionPool:
+    """Bounded pool of autocommit pyodbc connections for one connection string."""
+
+    def __init__(self, conn_string: str, max_size: int = POOL_MAX_SIZE,
+                 max_idle_seconds: float = POOL_MAX_IDLE_SECONDS,
+                 health_check_after_seconds: float = POOL_HEALTH_CHECK_AFTER_SECONDS,
+                 acquire_timeout_seconds: float = POOL_ACQUIRE_TIMEOUT_SECONDS):
+        self.conn_string = conn_string
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_after_seconds = health_check_after_seconds
+        self.acquire_timeout_seconds = acquire_timeout_seconds
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._metrics = {
+            "acquired": 0,
+            "created": 0,
+            "evicted_idle": 0,
+            "discarded_broken": 0,
+            "health_check_failures": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts": 0,
+        }
+
+    def _connect(self):
+        login_timeout = cap(None)
+        if login_timeout is None:
+            return pyodbc.connect(self.conn_string, autocommit=True)
+        return pyodbc.connect(self.conn_string, autocommit=True, timeout=max(1, math.ceil(login_timeout)))
+
+    def _is_healthy(self, entry: _PooledConnection) -> bool:
+        try:
+            cursor = entry.conn.cursor()
+            try:
+                cursor.execute("SELECT 1").fetchone()
+            finally:
+                cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    @staticmethod
+    def _close(entry: _PooledConnection):
+        try:
+            entry.conn.close()
+        except pyodbc.Error:
+            pass
+
+    def _evict_idle_locked(self, now: float) -> list:
+        # Oldest idle connections sit at the left end of the deque.
+        evicted = []
+        while self._idle and now - self._idle[0].last_used > self.max_idle_seconds:
+            evicted.append(self._idle.popleft())
+        self._size -= len(evicted)
+        self._metrics["evicted_idle"] += len(evicted)
+        return evicted
+
+    def _acquire(self) -> _PooledConnection:
+        start = time.monotonic()
+        # Waiting for a connection also ends at the request deadline.
+        timeout = cap(self.acquire_timeout_seconds)
+        deadline = start + timeout
+        waited = False
+        entry = None
+        evicted = []
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                evicted += self._evict_idle_locked(now)
+                if self._idle:
+                    # Reuse the most recently returned connection, it is the warmest.
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._metrics["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"no SQL connection available after {timeout:.1f}s "
+                        f"(max_size={self.max_size})")
+                waited = True
+                self._cond.wait(remaining)
+            waited_seconds = time.monotonic() - start
+            self._metrics["acquired"] += 1
+            if waited:
+                self._metrics["waits"] += 1
+                self._metrics["wait_seconds_total"] += waited_seconds
+                self._metrics["wait_seconds_max"] = max(self._metrics["wait_seconds_max"], waited_seconds)
+
+        for stale in evicted:
+            self._close(stale)
+
+        if entry is not None and time.monotonic() - entry.last_used > self.health_check_after_seconds:
+            if not self._is_healthy(entry):
+                with self._cond:
+                    self._metrics["health_check_failures"] += 1
+                self._close(entry)
+                entry = None
+
+        if entry is None:
+            try:
+                entry = _PooledConnection(self._connect())
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._metrics["created"] += 1
+        return entry
+
+    def _release(self, entry: _PooledConnection, discard: bool = False):
+        if discard:
+            self._close(entry)
+        with self._cond:
+            if discard:
+                self._size -= 1
+                self._metrics["discarded_broken"] += 1
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it goes back to the pool unless it turned out broken."""
+        entry = self._acquire()
+        discard = False
+        try:
+            yield entry.conn
+        except pyodbc.Error as e:
+            discard = _is_connection_error(e)
+            raise
+        finally:
+            self._release(entry, discard=discard)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for entry in idle:
+            self._close(entry)
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._metrics)
+            stats["size"] = self._size
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._size - len(self._idle)
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(conn_string: str) -> ConnectionPool:
+    """Return the process-wide pool for a connection string, creating it on first use."""
+    pool = _pools.get(conn_string)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(conn_string)
+            if pool is None:
+                pool = _pools[conn_string] = ConnectionPool(conn_string)
+    return pool
+
+
+def pool_stats() -> list:
+    """Metrics of every pool in this process, without exposing the connection strings."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _datetime_to_epoch_ms(value: datetime.datetime) -> int:
+    # Same encoding DataFrame.to_json used: naive datetimes are read as UTC.
+    if value.tzinfo is not None:
+        return int(value.timestamp() * 1000)
+    return (value - _EPOCH) // datetime.timedelta(milliseconds=1)
+
+
+def _date_to_epoch_ms(value: datetime.date) -> int:
+    return _datetime_to_epoch_ms(datetime.datetime(value.year, value.month, value.day))
+
+
+# Converters from pyodbc result types to JSON-native values, looked up by the
+# Python type pyodbc reports for each column in cursor.description.
+_JSON_CONVERTERS = {
+    decimal.Decimal: float,
+    datetime.datetime: _datetime_to_epoch_ms,
+    datetime.date: _date_to_epoch_ms,
+    datetime.time: datetime.time.isoformat,
+    uuid.UUID: str,
+    bytes: bytes.hex,
+    bytearray: bytes.hex,
+}
+
+
+def _column_converters(description) -> list:
+    return [_JSON_CONVERTERS.get(column[1]) for column in description]
+
+
+def iter_records(cursor, batch_size: int = FETCH_BATCH_SIZE):
+    """
+    Stream the current result set of a cursor as JSON-ready dicts.
+
+    Rows are pulled with fetchmany and converted in place, so the result set is
+    never copied into an intermediate DataFrame or JSON string. NULLs stay None.
+    """
+    columns = [column[0] for column in cursor.description]
+    converters = _column_converters(cursor.description)
+    converted = [(i, conv) for i, conv in enumerate(converters) if conv is not None]
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            if converted:
+                row = list(row)
+                for i, conv in converted:
+                    if row[i] is not None:
+                        row[i] = conv(row[i])
+            yield dict(zip(columns, row))
+
+
+def json_list_param(values) -> str:
+    """
+    Encode an IN-list as one JSON array parameter, to be unpacked with OPENJSON(?).
+
+    Binding the whole list as a single parameter keeps the statement text identical
+    for any number of ids, so SQL Server compiles and caches one plan for it.
+    """
+    return json.dumps(sorted(set(values)))
+
+
+def _input_sizes(params: tuple) -> list:
+    # pyodbc declares string parameters with their actual length, so the same
+    # statement would get a separate cached plan per length. Pin them to
+    # nvarchar(4000), or nvarchar(max) for longer values.
+    return [(pyodbc.SQL_WVARCHAR, 4000 if len(p) <= 4000 else 0, 0) if isinstance(p, str) else None
+            for p in params]
+
+
+def _set_query_timeout(conn):
+    # pyodbc query timeouts are whole seconds, 0 meaning none. Pooled connections keep
+    # the last value, so it is set before every statement.
+    left = remaining()
+    conn.timeout = 0 if left is None else max(1, math.ceil(left))
+
+
+def execute_sql(sql_query: str, conn_string: str, params: tuple = (), max_rows: Optional[int] = None) -> list:
+    """
+    Run a query on a pooled connection and return its rows as a list of dicts.
+
+    With max_rows, fetching stops once that many rows were read and the rest of
+    the result set is discarded with the cursor. Inside a deadline_scope the query
+    is cancelled by the driver when the request deadline passes.
+    """
+    with get_pool(conn_string).connection() as conn:
+        _set_query_timeout(conn)
+        cursor = conn.cursor()
+        try:
+            if params:
+                cursor.setinputsizes(_input_sizes(params))
+            cursor.execute(sql_query, *params)
+            if max_rows is None:
+                return list(iter_records(cursor))
+            return list(itertools.islice(iter_records(cursor, min(max_rows, FETCH_BATCH_SIZE) or 1), max_rows))
+        finally:
+            cursor.close()
+
+
+def execute_sql_batch(sql_query: str, conn_string: str, params: tuple = ()) -> list:
+    """Run a batch of statements in one round trip and return the rows of each result set, in order."""
+    with get_pool(conn_string).connection() as conn:
+        _set_query_timeout(conn)
+        cursor = conn.cursor()
+        try:
+            if params:
+                cursor.setinputsizes(_input_sizes(params))
+            cursor.execute(sql_query, *params)
+            results = []
+            while True:
+                # Row counts of statements without a result set come through as description None.
+                if cursor.description is not None:
+                    results.append(list(iter_records(cursor)))
+                if not cursor.nextset():
+                    return results
+        finally:
+            cursor.close()
+
+
+# pyodbc calls block, so async callers run them on this pool. It is sized like a
+# connection pool so that queued queries wait here rather than on a connection.
+_sql_threads = ThreadPoolExecutor(max_workers=POOL_MAX_SIZE, thread_name_prefix="sql")
+
+
+async def execute_sql_async(sql_query: str, conn_string: str, params: tuple = (),
+                            max_rows: Optional[int] = None) -> list:
+    """execute_sql for async tools: the query runs on a bounded worker thread."""
+    loop = asyncio.get_running_loop()
+    # The worker thread runs in a copy of the caller's context, so it sees the request deadline.
+    return await loop.run_in_executor(
+        _sql_threads, functools.partial(contextvars.copy_context().run, execute_sql, sql_query, conn_string, params,
+                                        max_rows))
+
+
+async def execute_sql_batch_async(sql_query: str, conn_string: str, params: tuple = ()) -> list:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _sql_threads, functools.partial(contextvars.copy_context().run, execute_sql_batch, sql_query, conn_string,
+                                        params))
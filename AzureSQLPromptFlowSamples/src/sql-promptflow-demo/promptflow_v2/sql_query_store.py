@@ -1,8 +1,18 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT license.
 
+import functools
+from typing import Optional
+
 from promptflow import tool
 
+from read_routing import READ_ONLY_QUERIES, get_read_router
+from sql_executor import execute_sql, execute_sql_async, execute_sql_batch, execute_sql_batch_async, json_list_param
+
+# All queries below are parameterized with "?" placeholders. IN-lists are bound as a
+# single JSON array and unpacked with OPENJSON, so every statement has one cached plan
+# no matter how many ids it is called with.
+
 # English only product description
 query_prod_detail = """
                     WITH pro_desc AS(
@@ -25,6 +35,20 @@ query_prod_detail = """
                     )
                     """
 
+# Customer columns the flow uses; password hashes and contact details stay in the database
+_customer_columns = "CustomerID, NameStyle, Title, FirstName, MiddleName, LastName, Suffix, CompanyName, SalesPerson, ModifiedDate"
+
+# Customer lookup by first and last name
+query_customer = f"""select {_customer_columns} from [SalesLT].[Customer]
+                    WHERE FirstName = ? AND LastName = ?"""
+
+# Every customer, loaded by customer_index to resolve names in memory
+query_customer_index = f"""select {_customer_columns} from [SalesLT].[Customer]"""
+
+# Customers modified since a ModifiedDate, merged into the customer_index
+query_customer_changes = f"""select {_customer_columns} from [SalesLT].[Customer]
+                    WHERE ModifiedDate >= ?"""
+
 # Customer order history
 query_order = query_prod_detail + """
                   SELECT p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description
@@ -34,16 +58,39 @@ query_order = query_prod_detail + """
                   ON sod.ProductID = p.ProductID
                   INNER JOIN SalesLT.SalesOrderHeader AS soh
                   ON sod.SalesOrderID = soh.SalesOrderID
-                  WHERE soh.CustomerID IN {list_cust}"""
+                  WHERE soh.CustomerID IN (SELECT id FROM OPENJSON(?) WITH (id int '$'))"""
+
+# Customer order history aggregated per product, most recently ordered first, at most TOP (?) rows
+query_order_summary = query_prod_detail + """
+                  SELECT TOP (?) p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description,
+                         SUM(sod.OrderQty) AS OrderQty, COUNT(DISTINCT soh.SalesOrderID) AS OrderCount,
+                         CONVERT(varchar(10), MAX(soh.OrderDate), 23) AS LastOrderDate
+                  FROM prod_detail AS p
+                  INNER JOIN
+                  SalesLT.SalesOrderDetail AS sod
+                  ON sod.ProductID = p.ProductID
+                  INNER JOIN SalesLT.SalesOrderHeader AS soh
+                  ON sod.SalesOrderID = soh.SalesOrderID
+                  WHERE soh.CustomerID IN (SELECT id FROM OPENJSON(?) WITH (id int '$'))
+                  GROUP BY p.ProductID, p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description
+                  ORDER BY MAX(soh.OrderDate) DESC, SUM(sod.OrderQty) DESC"""
 
 # product detail by id
 query_prod_byID = query_prod_detail + """
                   SELECT p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description, p.ProductCategoryID
                   FROM prod_detail AS p
-                  WHERE p.ProductID IN {list_product}"""
+                  WHERE p.ProductID IN (SELECT id FROM OPENJSON(?) WITH (id int '$'))"""
+
+# whole product catalog, loaded by catalog_snapshot instead of querying products one turn at a time
+query_prod_catalog = query_prod_detail + """
+                  SELECT p.ProductID, p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description, p.ProductCategoryID
+                  FROM prod_detail AS p"""
 
-# product sales stats by category id, returns top 5 most saled products for each category in the list
-query_sales_stat = query_prod_detail + """, prod_sales AS(
+# change tracking version of the database, polled by catalog_snapshot to notice catalog changes
+query_change_version = """SELECT CHANGE_TRACKING_CURRENT_VERSION() AS version"""
+
+# product sales stats, returns top 5 most saled products for each category in {category_ids}
+_sales_stat_template = query_prod_detail + """, prod_sales AS(
                         SELECT p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description, count(p.Name) as sales_count, p.ProductCategoryID,
                                 ROW_NUMBER() OVER(PARTITION BY p.ProductCategoryID ORDER BY count(p.Name) DESC) AS row_number
                         FROM prod_detail p
@@ -51,18 +98,139 @@ query_sales_stat = query_prod_detail + """, prod_sales AS(
                         ON p.ProductID = sod.ProductID
                         INNER JOIN SalesLT.ProductCategory pc
                         ON pc.ProductCategoryID = p.ProductCategoryID
-                        WHERE pc.ProductCategoryID IN {list_cate}
+                        WHERE pc.ProductCategoryID IN ({category_ids})
                         GROUP BY p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description, p.ProductCategoryID
                     )
                     SELECT p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description, p.sales_count
                     FROM prod_sales AS p
                     WHERE p.row_number <= 5"""
 
+# product sales stats by category id
+query_sales_stat = _sales_stat_template.format(category_ids="SELECT id FROM OPENJSON(?) WITH (id int '$')")
+
+# product detail by id, then the sales stats of the categories of those products: one batch and
+# one round trip with two result sets. Both statements take the JSON list of product ids.
+query_prod_and_sales = "SET NOCOUNT ON;\n" + query_prod_byID + ";\n" + _sales_stat_template.format(
+  category_ids="SELECT ProductCategoryID FROM prod_detail WHERE ProductID IN (SELECT id FROM OPENJSON(?) WITH (id int '$'))")
+
+# top 5 most saled products of every category, refreshed in the background by sales_leaderboard
+query_sales_leaderboard = query_prod_detail + """, prod_sales AS(
+                        SELECT p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description, count(p.Name) as sales_count, p.ProductCategoryID,
+                                ROW_NUMBER() OVER(PARTITION BY p.ProductCategoryID ORDER BY count(p.Name) DESC) AS row_number
+                        FROM prod_detail p
+                        INNER JOIN SalesLT.SalesOrderDetail sod
+                        ON p.ProductID = sod.ProductID
+                        GROUP BY p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description, p.ProductCategoryID
+                    )
+                    SELECT p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description, p.sales_count, p.ProductCategoryID
+                    FROM prod_sales AS p
+                    WHERE p.row_number <= 5"""
+
+# Batch runs: the customers of a whole run, looked up by a JSON list of {"FirstName", "LastName"}
+_customers_by_name = """SELECT {columns} FROM [SalesLT].[Customer] AS c
+                    INNER JOIN OPENJSON(?) WITH (FirstName nvarchar(50) '$.FirstName', LastName nvarchar(50) '$.LastName') AS n
+                    ON c.FirstName = n.FirstName AND c.LastName = n.LastName"""
+query_customers_by_name = _customers_by_name.format(columns=", ".join(
+  "c." + column for column in _customer_columns.split(", ")))
+
+# Batch runs: the CustomerIDs of those names, then the order lines of all of them with their CustomerID
+query_customer_orders_by_name = "SET NOCOUNT ON;\n" + _customers_by_name.format(columns="c.CustomerID") + ";\n" + \
+  query_prod_detail + """
+                  SELECT soh.CustomerID, p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description
+                  FROM prod_detail AS p
+                  INNER JOIN
+                  SalesLT.SalesOrderDetail AS sod
+                  ON sod.ProductID = p.ProductID
+                  INNER JOIN SalesLT.SalesOrderHeader AS soh
+                  ON sod.SalesOrderID = soh.SalesOrderID
+                  INNER JOIN SalesLT.Customer AS c
+                  ON c.CustomerID = soh.CustomerID
+                  INNER JOIN OPENJSON(?) WITH (FirstName nvarchar(50) '$.FirstName', LastName nvarchar(50) '$.LastName') AS n
+                  ON c.FirstName = n.FirstName AND c.LastName = n.LastName"""
+
+# Batch runs: as above, with the order history aggregated per customer and product like query_order_summary,
+# at most ? rows per customer
+query_customer_order_summary_by_name = "SET NOCOUNT ON;\n" + _customers_by_name.format(columns="c.CustomerID") + \
+  ";\n" + query_prod_detail + """, customer_summary AS(
+                  SELECT soh.CustomerID, p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description,
+                         SUM(sod.OrderQty) AS OrderQty, COUNT(DISTINCT soh.SalesOrderID) AS OrderCount,
+                         CONVERT(varchar(10), MAX(soh.OrderDate), 23) AS LastOrderDate,
+                         ROW_NUMBER() OVER(PARTITION BY soh.CustomerID
+                                           ORDER BY MAX(soh.OrderDate) DESC, SUM(sod.OrderQty) DESC) AS row_number
+                  FROM prod_detail AS p
+                  INNER JOIN
+                  SalesLT.SalesOrderDetail AS sod
+                  ON sod.ProductID = p.ProductID
+                  INNER JOIN SalesLT.SalesOrderHeader AS soh
+                  ON sod.SalesOrderID = soh.SalesOrderID
+                  INNER JOIN SalesLT.Customer AS c
+                  ON c.CustomerID = soh.CustomerID
+                  INNER JOIN OPENJSON(?) WITH (FirstName nvarchar(50) '$.FirstName', LastName nvarchar(50) '$.LastName') AS n
+                  ON c.FirstName = n.FirstName AND c.LastName = n.LastName
+                  GROUP BY soh.CustomerID, p.ProductID, p.Name, p.Category, p.Color, p.Size, p.Weight, p.ListPrice, p.Description)
+                  SELECT CustomerID, Name, Category, Color, Size, Weight, ListPrice, Description, OrderQty, OrderCount, LastOrderDate
+                  FROM customer_summary
+                  WHERE row_number <= ?"""
+
+# Registry of the prepared statements, by name
+QUERY_REGISTRY = {
+  'query_customer': query_customer,
+  'query_customer_index': query_customer_index,
+  'query_customer_changes': query_customer_changes,
+  'query_order': query_order,
+  'query_order_summary': query_order_summary,
+  'query_prod_byID': query_prod_byID,
+  'query_prod_catalog': query_prod_catalog,
+  'query_change_version': query_change_version,
+  'query_sales_stat': query_sales_stat,
+  'query_prod_and_sales': query_prod_and_sales,
+  'query_sales_leaderboard': query_sales_leaderboard,
+  'query_customers_by_name': query_customers_by_name,
+  'query_customer_orders_by_name': query_customer_orders_by_name,
+  'query_customer_order_summary_by_name': query_customer_order_summary_by_name
+}
+
+
+def _bind(params: tuple) -> tuple:
+  return tuple(json_list_param(p) if isinstance(p, (list, tuple, set)) else p for p in params)
+
+
+def _run(name: str, conn_string: str, run, **kwargs):
+  # Read-only retrieval statements go to a readable replica when the connection has any.
+  if name in READ_ONLY_QUERIES:
+    return get_read_router(conn_string).execute(run, **kwargs)
+  return run(conn_string, **kwargs)
+
+
+async def _run_async(name: str, conn_string: str, run, **kwargs):
+  if name in READ_ONLY_QUERIES:
+    return await get_read_router(conn_string).execute_async(run, **kwargs)
+  return await run(conn_string, **kwargs)
+
+
+def run_query(sql_query_prep: dict, name: str, conn_string: str, *params, max_rows: Optional[int] = None) -> list:
+  """Execute a registered statement; list, tuple and set arguments are bound as JSON IN-lists."""
+  return _run(name, conn_string, functools.partial(execute_sql, sql_query_prep[name]), params=_bind(params),
+              max_rows=max_rows)
+
+
+async def run_query_async(sql_query_prep: dict, name: str, conn_string: str, *params,
+                          max_rows: Optional[int] = None) -> list:
+  return await _run_async(name, conn_string, functools.partial(execute_sql_async, sql_query_prep[name]),
+                          params=_bind(params), max_rows=max_rows)
+
+
+def run_query_batch(sql_query_prep: dict, name: str, conn_string: str, *params) -> list:
+  """Execute a registered batch and return the rows of each of its result sets."""
+  return _run(name, conn_string, functools.partial(execute_sql_batch, sql_query_prep[name]), params=_bind(params))
+
+
+async def run_query_batch_async(sql_query_prep: dict, name: str, conn_string: str, *params) -> list:
+  return await _run_async(name, conn_string, functools.partial(execute_sql_batch_async, sql_query_prep[name]),
+                          params=_bind(params))
+
+
 @tool
 def sql_query_prep():
 
-  return {
-    'query_order': query_order,
-    'query_prod_byID': query_prod_byID,
-    'query_sales_stat': query_sales_stat
-  }
\ No newline at end of file
+  return dict(QUERY_REGISTRY)
\ No newline at end of file
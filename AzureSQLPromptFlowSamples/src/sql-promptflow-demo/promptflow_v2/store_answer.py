@@ -0,0 +1,25 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+from promptflow import tool
+from promptflow.connections import CustomConnection
+
+from answer_cache import get_answer_cache
+from search_client import generate_embeddings_async
+
+
+@tool
+async def store_answer(lookup: dict, completion: object, question: str, conn: CustomConnection):
+    # completion is None when the chat node was skipped for a cache hit.
+    if lookup["hit"]:
+        return lookup["answer"]
+    if not lookup["enabled"] or not isinstance(completion, str):
+        # Disabled, or a streamed answer, which is passed on as it is.
+        return completion
+
+    try:
+        vector = await generate_embeddings_async(text=question, conn=conn)
+        get_answer_cache().put(lookup["prompt"], question, vector, completion)
+    except:
+        pass
+    return completion
@@ -0,0 +1,52 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""
+Token counting with the cl100k_base encoding of the chat and embedding models.
+
+tiktoken downloads the encoding on first use when it is not cached. The
+encoding is loaded lazily, and when tiktoken is not installed or the download
+fails the counts fall back to a rough English average of four characters per
+token, so a missing encoding never fails a flow or an indexing run.
+"""
+
+import threading
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """The cl100k_base encoding, or None when it cannot be loaded."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """text cut to max_tokens tokens, with "..." appended when it was cut."""
+    encoding = get_encoding()
+    if encoding is None:
+        if len(text) <= max_tokens * 4:
+            return text
+        return text[:max_tokens * 4].rsplit(" ", 1)[0] + "..."
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]).rstrip() + "..."
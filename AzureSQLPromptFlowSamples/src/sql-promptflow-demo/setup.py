@@ -83,9 +83,18 @@ print("Setting up SQL connections.")
 print('Getting SQL Connection STRING from keyvault')
 connection_string = get_keyvault_secret(config['keyvault_uri'], 'connection-string')
 
+# Read-only retrieval queries go to these servers with ApplicationIntent=ReadOnly; "" is the
+# readable secondary of the primary's own server. Without any, all queries go to the primary.
+sql_configs = {}
+if config.get('read_replica_servers'):
+    sql_configs["read-replica-servers"] = ",".join(config['read_replica_servers'])
+    if config.get('read_max_staleness_seconds') is not None:
+        sql_configs["read-max-staleness-seconds"] = str(config['read_max_staleness_seconds'])
+
 connection = CustomConnection(
     name=config['SQLDB_connection_name'],
-    secrets={"connection-string": connection_string}
+    secrets={"connection-string": connection_string},
+    configs=sql_configs
 )
 conn = pf.connections.create_or_update(connection)
 print("successfully created connection")
@@ -128,6 +137,20 @@ for node in config_flow["nodes"]:
             node['inputs']['conn_db'] = config['SQLDB_connection_name']
         if 'conn' in node['inputs']:
             node['inputs']['conn'] = config['ACS_connection_name']
+        # "acs" searches Azure Cognitive Search, "local" an in-process copy of the product vectors
+        if 'retriever' in node['inputs']:
+            node['inputs']['retriever'] = config.get('product_retriever', 'acs')
+            node['inputs']['local_index_path'] = config.get('local_index_path', '')
+        # "snapshot" hydrates products from the in-memory catalog, "sql" reads them with their sales stats in one batch
+        if 'product_source' in node['inputs']:
+            node['inputs']['product_source'] = config.get('product_source', 'snapshot')
+        # Reuse chat answers for near-duplicate questions over the same context; false calls the model every time
+        if 'answer_cache_enabled' in node['inputs']:
+            node['inputs']['answer_cache_enabled'] = config.get('answer_cache_enabled', True)
+        # Time budget of a whole request; hedging resends slow ACS search and embedding calls
+        if 'budget_seconds' in node['inputs']:
+            node['inputs']['budget_seconds'] = config.get('request_deadline_seconds', 20)
+            node['inputs']['hedge'] = config.get('hedge_requests', False)
 
 # write the yaml file back
 with open('./promptflow_v2/flow.dag.yaml', 'w') as f:
@@ -0,0 +1,196 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""Tests of acs/incremental_indexer.py against a fake change-tracking database."""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "acs"))
+
+from incremental_indexer import (CHANGED_PRODUCTS_QUERY, MIN_VALID_VERSION_QUERY, PRODUCTS_BY_ID_QUERY,  # noqa: E402
+                                 IncrementalIndexer, SqlChangeSource, SyncState)
+from product_indexer import PRODUCT_QUERY  # noqa: E402
+
+
+class FakeDatabase:
+    """Products, change-tracking versions and the CHANGETABLE answer, behind pyodbc.connect."""
+
+    def __init__(self):
+        self.products = {}
+        self.version = 1
+        self.min_valid_version = 0
+        self.changed = []
+        self.queries = []
+
+    def product(self, product_id, description, category="Bikes"):
+        return {"ProductCategoryName": category, "ProductId": product_id, "Name": f"Product {product_id}",
+                "ListPrice": 10, "Description": description}
+
+    def rows(self, sql, params):
+        self.queries.append(sql)
+        if sql.startswith("SELECT CHANGE_TRACKING_CURRENT_VERSION"):
+            return ["version"], [(self.version,)]
+        if sql == MIN_VALID_VERSION_QUERY:
+            return [""], [(self.min_valid_version,)]
+        if sql == CHANGED_PRODUCTS_QUERY:
+            return ["ProductID"], [(product_id,) for product_id in self.changed]
+        if sql == PRODUCTS_BY_ID_QUERY:
+            ids = set(json.loads(params[0]))
+            products = [product for product_id, product in self.products.items() if product_id in ids]
+        elif sql == PRODUCT_QUERY:
+            products = list(self.products.values())
+        else:
+            raise AssertionError(f"unexpected query {sql!r}")
+        columns = ["ProductCategoryName", "ProductId", "Name", "ListPrice", "Description"]
+        return columns, [tuple(product[column] for column in columns) for product in products]
+
+    def connect(self, connection_string):
+        return FakeConnection(self)
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.description = None
+        self._rows = []
+
+    def execute(self, sql, *params):
+        columns, self._rows = self.database.rows(sql, params)
+        self.description = [(column,) for column in columns]
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self):
+        return FakeCursor(self.database)
+
+    def close(self):
+        pass
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def embed(self, texts, progress=None):
+        self.texts.extend(texts)
+        return {text: [float(len(text))] for text in texts}
+
+
+class FakeIndex:
+    def __init__(self):
+        self.documents = {}
+        self.calls = []
+
+    def send(self, documents, action):
+        self.calls.append((action, sorted(doc["ProductId"] for doc in documents)))
+        for doc in documents:
+            if action == "delete":
+                self.documents.pop(doc["ProductId"], None)
+            else:
+                self.documents[doc["ProductId"]] = {**self.documents.get(doc["ProductId"], {}), **doc}
+        return {"succeeded": len(documents), "failed": 0}
+
+
+@pytest.fixture
+def database():
+    database = FakeDatabase()
+    for product_id, description in ((1, "Road bike"), (2, "Mountain bike"), (3, "Helmet")):
+        database.products[product_id] = database.product(product_id, description)
+    return database
+
+
+def make_indexer(database, tmp_path):
+    embedder, index = FakeEmbedder(), FakeIndex()
+    state = SyncState(str(tmp_path / "state.json"))
+    indexer = IncrementalIndexer(SqlChangeSource("Driver=fake", connect=database.connect), embedder, index.send, state)
+    return indexer, embedder, index
+
+
+def test_first_sync_loads_and_embeds_everything(database, tmp_path):
+    indexer, embedder, index = make_indexer(database, tmp_path)
+
+    result = indexer.sync()
+
+    assert result == {"full_sync": 1, "embedded": 3, "merged": 0, "deleted": 0, "version": 1}
+    assert index.calls == [("upload", ["1", "2", "3"])]
+    assert index.documents["1"]["DescriptionVector"] == [float(len("Road bike"))]
+    assert "_hash" not in index.documents["1"]
+    assert MIN_VALID_VERSION_QUERY not in database.queries
+    saved = SyncState(str(tmp_path / "state.json"))
+    assert saved.version == 1 and sorted(saved.hashes) == ["1", "2", "3"]
+
+
+def test_incremental_sync_upserts_and_deletes_changed_products(database, tmp_path):
+    indexer, embedder, index = make_indexer(database, tmp_path)
+    indexer.sync()
+    embedder.texts.clear()
+    index.calls.clear()
+
+    database.version = 2
+    database.products[1] = database.product(1, "Carbon road bike")
+    database.products[2]["ListPrice"] = 12
+    del database.products[3]
+    database.changed = [1, 2, 3]
+    result = indexer.sync()
+
+    assert result == {"full_sync": 0, "embedded": 1, "merged": 1, "deleted": 1, "version": 2}
+    # Only the changed description is embedded again; the price change keeps the stored vectors.
+    assert embedder.texts == ["Carbon road bike", "Bikes"]
+    assert index.calls == [("upload", ["1"]), ("merge_or_upload", ["2"]), ("delete", ["3"])]
+    assert index.documents["2"]["ListPrice"] == 12.0
+    assert sorted(index.documents) == ["1", "2"]
+    assert sorted(indexer.state.hashes) == ["1", "2"]
+    assert database.queries.count(PRODUCT_QUERY) == 1
+
+
+def test_incremental_sync_without_changes_sends_nothing(database, tmp_path):
+    indexer, _, index = make_indexer(database, tmp_path)
+    indexer.sync()
+    index.calls.clear()
+
+    database.version = 2
+    result = indexer.sync()
+
+    assert result == {"full_sync": 0, "embedded": 0, "merged": 0, "deleted": 0, "version": 2}
+    assert index.calls == []
+
+
+@pytest.mark.parametrize("min_valid_version", [5, None])
+def test_full_reload_when_changes_are_no_longer_available(database, tmp_path, min_valid_version):
+    indexer, embedder, index = make_indexer(database, tmp_path)
+    indexer.sync()
+    embedder.texts.clear()
+    index.calls.clear()
+
+    # The changes since version 1 were cleaned up (or change tracking was turned off).
+    database.version = 6
+    database.min_valid_version = min_valid_version
+    del database.products[2]
+    database.products[3] = database.product(3, "Full face helmet")
+    result = indexer.sync()
+
+    assert result == {"full_sync": 1, "embedded": 1, "merged": 1, "deleted": 1, "version": 6}
+    assert CHANGED_PRODUCTS_QUERY not in database.queries
+    assert index.calls == [("upload", ["3"]), ("merge_or_upload", ["1"]), ("delete", ["2"])]
+    assert indexer.state.version == 6
+
+
+def test_rejected_documents_keep_the_old_version(database, tmp_path):
+    indexer, _, _ = make_indexer(database, tmp_path)
+    indexer.send = lambda documents, action: {"failed": len(documents)}
+
+    with pytest.raises(RuntimeError):
+        indexer.sync()
+
+    assert indexer.state.version is None
+    assert not os.path.exists(tmp_path / "state.json")
@@ -0,0 +1,165 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT license.
+
+"""Tests of promptflow_v2/read_routing.py against a fake SQL backend."""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "promptflow_v2"))
+
+import pyodbc  # noqa: E402
+
+import read_routing  # noqa: E402
+from deadline import deadline_scope, new_deadline, remaining  # noqa: E402
+from read_routing import STALENESS_QUERY, ReadRouter, replica_connection_string  # noqa: E402
+
+
+class FakeBackend:
+    """Stands in for execute_sql; records the endpoint of every statement."""
+
+    def __init__(self):
+        self.down = set()
+        self.lag = {}
+        self.calls = []
+        self.deadlines = []
+
+    def __call__(self, sql, conn_string, params=(), max_rows=None):
+        self.calls.append((sql, conn_string))
+        self.deadlines.append(remaining())
+        if conn_string in self.down:
+            raise pyodbc.OperationalError("08001", "server unreachable")
+        if sql == STALENESS_QUERY:
+            return [{"lag_seconds": self.lag.get(conn_string)}]
+        return [{"endpoint": conn_string}]
+
+    def run(self, conn_string, *args, **kwargs):
+        return self("SELECT 1", conn_string, *args, **kwargs)
+
+    async def run_async(self, conn_string, *args, **kwargs):
+        return self.run(conn_string, *args, **kwargs)
+
+    def reads(self):
+        return [conn_string for sql, conn_string in self.calls if sql != STALENESS_QUERY]
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+def endpoints(router, backend, count):
+    return [router.execute(backend.run)[0]["endpoint"] for _ in range(count)]
+
+
+def test_reads_rotate_over_the_replicas(backend):
+    router = ReadRouter("primary", ["r1", "r2"], execute=backend)
+
+    assert endpoints(router, backend, 4) == ["r1", "r2", "r1", "r2"]
+    assert router.stats()["replica_reads"] == 4
+    assert router.stats()["primary_reads"] == 0
+
+
+def test_unreachable_replica_is_marked_down_and_the_read_fails_over(backend):
+    router = ReadRouter("primary", ["r1", "r2"], execute=backend)
+    backend.down.add("r1")
+
+    assert endpoints(router, backend, 3) == ["r2", "r2", "r2"]
+    # r1 is skipped while it is down rather than tried on every read.
+    assert backend.reads().count("r1") == 1
+    stats = router.stats()
+    assert stats["failovers"] == 1
+    assert stats["replicas_down"] == 1
+
+
+def test_replica_is_tried_again_after_the_retry_interval(backend):
+    router = ReadRouter("primary", ["r1"], execute=backend)
+    backend.down.add("r1")
+    assert endpoints(router, backend, 1) == ["primary"]
+
+    backend.down.clear()
+    # REPLICA_RETRY_SECONDS later:
+    router._replicas[0].down_until = 0.0
+    assert endpoints(router, backend, 1) == ["r1"]
+
+
+def test_stale_replica_is_skipped(backend):
+    router = ReadRouter("primary", ["r1", "r2"], max_staleness_seconds=5, execute=backend)
+    backend.lag = {"r1": 60, "r2": 1}
+
+    assert endpoints(router, backend, 3) == ["r2", "r2", "r2"]
+    stats = router.stats()
+    assert stats["stale_skips"] == 1
+    assert stats["replica_lag_seconds"] == [60, 1]
+
+
+def test_primary_serves_when_no_replica_is_usable(backend):
+    router = ReadRouter("primary", ["r1", "r2"], max_staleness_seconds=5, execute=backend)
+    backend.down.add("r1")
+    backend.lag["r2"] = 60
+
+    assert endpoints(router, backend, 2) == ["primary", "primary"]
+    assert router.stats()["primary_reads"] == 2
+
+
+def test_query_errors_do_not_fail_over(backend):
+    router = ReadRouter("primary", ["r1"], execute=backend)
+
+    def bad_query(conn_string):
+        raise pyodbc.ProgrammingError("42S02", "Invalid object name")
+
+    with pytest.raises(pyodbc.ProgrammingError):
+        router.execute(bad_query)
+    assert router.stats()["replicas_down"] == 0
+
+
+def test_query_timeouts_do_not_fail_over(backend):
+    router = ReadRouter("primary", ["r1", "r2"], execute=backend)
+
+    def slow_query(conn_string):
+        raise pyodbc.OperationalError("HYT00", "[HYT00] Query timeout expired")
+
+    with pytest.raises(pyodbc.OperationalError):
+        router.execute(slow_query)
+    assert router.stats()["replicas_down"] == 0
+    assert router.stats()["failovers"] == 0
+    assert endpoints(router, backend, 2) == ["r2", "r1"]
+
+
+def test_execute_async_fails_over_and_keeps_the_deadline(backend):
+    router = ReadRouter("primary", ["r1", "r2"], max_staleness_seconds=5, execute=backend)
+    backend.down.add("r1")
+
+    async def read():
+        with deadline_scope(new_deadline(30)):
+            return [(await router.execute_async(backend.run_async))[0]["endpoint"] for _ in range(2)]
+
+    assert asyncio.run(read()) == ["r2", "r2"]
+    # The staleness checks ran on the executor under the caller's deadline.
+    staleness_deadlines = [deadline for (sql, _), deadline in zip(backend.calls, backend.deadlines)
+                           if sql == STALENESS_QUERY]
+    assert staleness_deadlines and all(deadline is not None for deadline in staleness_deadlines)
+
+
+def test_replica_connection_string_sets_read_only_intent():
+    primary = "Driver={ODBC Driver 18};Server=tcp:p.database.windows.net,1433;Database=db;ApplicationIntent=ReadWrite;"
+
+    assert replica_connection_string(primary) == \
+        "Driver={ODBC Driver 18};Server=tcp:p.database.windows.net,1433;Database=db;ApplicationIntent=ReadOnly;"
+    assert replica_connection_string(primary, "tcp:geo.database.windows.net,1433") == \
+        "Server=tcp:geo.database.windows.net,1433;Driver={ODBC Driver 18};Database=db;ApplicationIntent=ReadOnly;"
+
+
+def test_connection_string_registers_the_configured_replicas():
+    conn_db = {"connection-string": "Server=p;Database=routing_test", "read-replica-servers": ", geo",
+               "read-max-staleness-seconds": "15"}
+
+    assert read_routing.connection_string(conn_db) == "Server=p;Database=routing_test"
+    router = read_routing.get_read_router("Server=p;Database=routing_test")
+    assert [replica.conn_string for replica in router._replicas] == \
+        ["Server=p;Database=routing_test;ApplicationIntent=ReadOnly;",
+         "Server=geo;Database=routing_test;ApplicationIntent=ReadOnly;"]
+    assert router.max_staleness_seconds == 15.0